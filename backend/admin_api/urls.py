@@ -7,4 +7,5 @@ urlpatterns = [
     path("transactions/", views.transaction_list, name="admin-transaction-list"),
     path("users/<int:user_id>/toggle-status/", views.toggle_user_status, name="admin-toggle-user-status"),
     path("currencies/", views.currency_status, name="admin-currency-status"),
+    path("topups/import/", views.topup_import, name="admin-topup-import"),
 ]
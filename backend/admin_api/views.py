@@ -1,16 +1,22 @@
+import io
+
 from django.db.models import Sum, Count
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from django.views.decorators.http import condition
 
 from accounts.models import User
-from wallet.models import Wallet
+from wallet.imports import import_topups, is_utf8
+from wallet.models import Wallet, WalletShard
 from transactions.models import Transaction
 from currency.models import Currency
 from accounts.serializers import UserSerializer
-from transactions.serializers import TransactionSerializer
+from transactions.pagination import InvalidCursor, keyset_page, link_next, page_request
+from transactions.serializers import encode_transactions, listing_rows
 from currency.serializers import CurrencySerializer
+from currency.caching import versioned_etag, versioned_json_response, versioned_last_modified
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
@@ -23,10 +29,18 @@ def dashboard_stats(request):
     total_volume = Transaction.objects.aggregate(sum=Sum('amount_sent'))['sum'] or 0
     
     # Balance across all wallets per currency
-    wallets_by_currency = Wallet.objects.values('currency').annotate(
+    wallets_by_currency = list(Wallet.objects.values('currency').annotate(
         total_balance=Sum('balance'),
         count=Count('id')
+    ))
+    # credits to sharded wallets sit on shard rows until they are folded
+    shard_totals = dict(
+        WalletShard.objects.values('wallet__currency')
+        .annotate(total=Sum('balance'))
+        .values_list('wallet__currency', 'total')
     )
+    for row in wallets_by_currency:
+        row['total_balance'] += shard_totals.get(row['currency'], 0)
 
     return Response({
         "total_users": total_users,
@@ -47,10 +61,17 @@ def user_list(request):
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def transaction_list(request):
-    """List all transactions."""
-    transactions = Transaction.objects.all().order_by('-created_at')
-    serializer = TransactionSerializer(transactions, many=True, context={'request': request})
-    return Response(serializer.data)
+    """List all transactions, newest first, a page at a time."""
+    try:
+        page_size, position = page_request(request)
+    except InvalidCursor:
+        return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError:
+        return Response({"error": "page_size must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+    wallet_ids = list(Wallet.objects.filter(user=request.user).values_list('id', flat=True))
+    page, has_more = keyset_page([listing_rows(Transaction.objects.all())], page_size, position)
+    return link_next(request, Response(encode_transactions(page, wallet_ids)), page, has_more)
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
@@ -69,8 +90,40 @@ def toggle_user_status(request, user_id):
 
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
+@condition(
+    etag_func=lambda request: versioned_etag('currency_status', request),
+    last_modified_func=versioned_last_modified
+)
 def currency_status(request):
     """Get all currencies and their current rates."""
-    currencies = Currency.objects.all().order_by('code')
-    serializer = CurrencySerializer(currencies, many=True, context={'request': request})
-    return Response(serializer.data)
+    def build():
+        currencies = Currency.objects.all().order_by('code')
+        serializer = CurrencySerializer(currencies, many=True, context={'request': request})
+        return serializer.data
+
+    return versioned_json_response('currency_status', request, build)
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def topup_import(request):
+    """Credit wallets from an uploaded CSV of email,currency,amount rows."""
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({"error": "CSV file is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # validated up front, the import commits chunk by chunk
+    if not is_utf8(upload.file):
+        return Response({"error": "CSV must be UTF-8"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # stream the upload instead of reading it into memory
+    result = import_topups(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''))
+
+    return Response({
+        "credited": result.credited,
+        "total": result.total,
+        "rejected_count": len(result.rejected),
+        "rejected": [
+            {"line": r.line, "row": r.row, "error": r.error}
+            for r in result.rejected[:1000]
+        ],
+    })
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported after Django is set up
+from currency.stream import RateStreamApp  # noqa: E402
+
+application = RateStreamApp(django_application)
@@ -0,0 +1,56 @@
+"""
+Per-request SQL instrumentation.
+
+Counts the queries a request runs and the time spent in the database
+with connection.execute_wrapper, so it works without DEBUG's query log,
+and reports them as X-Query-Count and Server-Timing response headers.
+Only installed when QUERY_COUNT_HEADERS is on.
+
+Headers go out before a StreamingHttpResponse's body is read, so for
+streamed responses (the CSV export) the numbers only cover the queries
+run before streaming started; the ones the body runs as it is read are
+not counted. Server-Timing says so in its description. QueryBudgetTest
+drains streamed bodies, so the budgets in config/urls.py do include
+them.
+"""
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class QueryCountMiddleware:
+    def __init__(self, get_response):
+        if not settings.QUERY_COUNT_HEADERS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        queries = f"{counter.count} queries"
+        if response.streaming:
+            queries += " before streaming"
+        response["X-Query-Count"] = str(counter.count)
+        response["Server-Timing"] = f"db;dur={counter.duration * 1000:.1f};desc=\"{queries}\""
+        return response
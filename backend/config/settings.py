@@ -9,6 +9,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 DEBUG = os.getenv("DEBUG") == "True"
+# Report SQL query count and time on every response (X-Query-Count, Server-Timing)
+QUERY_COUNT_HEADERS = os.getenv("QUERY_COUNT_HEADERS", str(DEBUG)) == "True"
 
 ALLOWED_HOSTS = ["*"]  # dev safe
 
@@ -39,6 +41,7 @@ INSTALLED_APPS = [
 # -------------------------
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware', 
+    'config.middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -138,7 +141,81 @@ SIMPLE_JWT = {
 }
 
 
+# -------------------------
+# CURRENCY RATES
+# -------------------------
+# Seconds a worker may serve rates from memory before checking
+# whether they changed in the database
+RATE_CACHE_TTL = int(os.getenv("RATE_CACHE_TTL", "5"))
+
+# Seconds between rate checks feeding /api/stream/rates/
+RATE_STREAM_INTERVAL = float(os.getenv("RATE_STREAM_INTERVAL", "1"))
+
+# Seconds a rate quote from /api/quotes/ stays executable
+QUOTE_TTL = int(os.getenv("QUOTE_TTL", "30"))
+
+# Providers queried by update_rates: registry names, file:<path> or URLs
+RATE_PROVIDERS = os.getenv("RATE_PROVIDERS", "exchangerate-api").split(",")
+
+# -------------------------
+# CACHE
+# -------------------------
+# Rate quotes live only in the cache, so with several workers it must be
+# shared: set REDIS_URL in production. Without it each process has its own.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
+# -------------------------
+# IDEMPOTENCY KEYS
+# -------------------------
+# Seconds a stored response is replayed for a repeated Idempotency-Key
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", str(24 * 60 * 60)))
+# Seconds a retry waits for the original request to finish
+IDEMPOTENCY_WAIT_SECONDS = int(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# Seconds an unfinished request holds its key; after that a retry takes
+# the key over, in case the original request died mid-flight
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", str(3 * IDEMPOTENCY_WAIT_SECONDS)))
+
+# -------------------------
+# TRANSACTION HISTORY
+# -------------------------
+# Rows per /api/transactions/ page unless the client asks for page_size
+TRANSACTION_PAGE_SIZE = int(os.getenv("TRANSACTION_PAGE_SIZE", "50"))
+
+# -------------------------
+# ASYNC TRANSFERS
+# -------------------------
+# Seconds after which a job claimed by a worker that never finished it
+# is handed to another worker
+TRANSFER_JOB_TIMEOUT = int(os.getenv("TRANSFER_JOB_TIMEOUT", "300"))
+
+# -------------------------
+# EXPORT JOBS
+# -------------------------
+# Seconds after which an export claimed by a worker that never finished
+# it is handed to another worker
+EXPORT_JOB_TIMEOUT = int(os.getenv("EXPORT_JOB_TIMEOUT", "1800"))
+# Days finished exports are kept before purge_exports deletes them
+EXPORT_RETENTION_DAYS = int(os.getenv("EXPORT_RETENTION_DAYS", "7"))
+
+
 MEDIA_URL = "/media/"
+# Scheme and host that absolute media links (currency logos) point at.
+# Configured rather than taken from the request's Host header, which
+# ALLOWED_HOSTS = ["*"] leaves unvalidated.
+MEDIA_ORIGIN = os.getenv("MEDIA_ORIGIN", "http://127.0.0.1:8000").rstrip("/")
 MEDIA_ROOT = BASE_DIR / "media"
 
 CORS_ALLOWED_ORIGINS = [
@@ -156,8 +233,12 @@ from corsheaders.defaults import default_headers
 
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "authorization",
+    "idempotency-key",
+    "prefer",
 ]
 
+CORS_EXPOSE_HEADERS = ["X-Query-Count", "Server-Timing", "X-Next-Cursor", "Link"]
+
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
@@ -0,0 +1,97 @@
+import random
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from accounts.models import User
+from currency.models import Currency
+from currency.rates import rate_table
+from transactions.models import Transaction
+from wallet.models import Wallet
+from config.urls import QUERY_BUDGETS
+
+USERS = 50
+TRANSACTIONS = 1000
+CURRENCIES = ('USD', 'EUR', 'GBP', 'INR', 'JPY')
+# the requesting user holds many more wallets than anyone else, so a
+# budget that grows per wallet fails here
+OWN_CURRENCIES = CURRENCIES + tuple(f'X{i:02d}' for i in range(25))
+
+
+class QueryBudgetTest(APITestCase):
+    """Every endpoint in QUERY_BUDGETS stays within its budget on realistic data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        Currency.objects.bulk_create([
+            Currency(code=code, name=code, rate_to_base=rng.uniform(0.5, 150))
+            for code in OWN_CURRENCIES
+        ])
+
+        users = User.objects.bulk_create([
+            User(email=f'user{i}@example.com') for i in range(USERS)
+        ])
+        cls.user = users[0]
+        cls.user.is_staff = True
+        cls.user.save()
+
+        wallets = Wallet.objects.bulk_create([
+            Wallet(user=user, currency=code, balance=Decimal('1000.00'))
+            for user in users for code in (OWN_CURRENCIES if user == cls.user else CURRENCIES)
+        ])
+        # half the transactions touch the requesting user so history is long
+        own = wallets[:len(OWN_CURRENCIES)]
+        Transaction.objects.bulk_create([
+            Transaction(
+                sender=sender,
+                receiver=receiver,
+                amount_sent=Decimal('10.00'),
+                amount_received=Decimal('12.50'),
+                from_currency=sender.currency,
+                to_currency=receiver.currency
+            )
+            for sender, receiver in (
+                rng.sample(own if i % 2 else wallets, 1) + rng.sample(wallets, 1)
+                for i in range(TRANSACTIONS)
+            )
+        ])
+
+    def setUp(self):
+        rate_table.invalidate()
+        self.client.force_authenticate(user=self.user)
+
+    def test_query_budgets(self):
+        for url, budget in QUERY_BUDGETS.items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                    if response.streaming:
+                        # streamed responses query while they are read
+                        b''.join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(
+                    len(queries), budget,
+                    f'{url} ran {len(queries)} queries, budget is {budget}:\n'
+                    + '\n'.join(query['sql'] for query in queries.captured_queries[:10])
+                )
+
+    def test_query_count_headers(self):
+        with self.settings(QUERY_COUNT_HEADERS=True):
+            # middleware is set up per handler, so build a fresh one
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            response = client.get('/api/favorites/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(int(response['X-Query-Count']), QUERY_BUDGETS['/api/favorites/'])
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        with self.settings(QUERY_COUNT_HEADERS=True):
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            response = client.get('/api/export/')
+        self.assertTrue(response.streaming)
+        self.assertIn('queries before streaming', response['Server-Timing'])
+        response.close()
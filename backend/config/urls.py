@@ -23,3 +23,23 @@ urlpatterns = [
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
+# Most SQL queries each GET endpoint may run. config/tests.py checks them
+# against seeded data, so a budget that would have to grow with the data
+# means an N+1 crept in.
+QUERY_BUDGETS = {
+    "/api/profile/": 0,
+    "/api/favorites/": 1,
+    "/api/wallets/": 1,
+    "/api/currencies/": 3,
+    "/api/rates/matrix/": 3,
+    # wallet ids, then one UNION ALL of index walks however many wallets
+    "/api/transactions/": 2,
+    "/api/analytics/": 1,
+    # wallet ids, then one streamed UNION ALL of index walks
+    "/api/export/": 2,
+    "/api/admin-ui/stats/": 6,
+    "/api/admin-ui/users/": 1,
+    "/api/admin-ui/transactions/": 2,
+    "/api/admin-ui/currencies/": 3,
+}
+
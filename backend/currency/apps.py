@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CurrencyConfig(AppConfig):
     name = 'currency'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,47 @@
+"""
+Response caching keyed on the rate version.
+
+Every Currency change bumps the rate version, so a payload rendered for
+one version stays valid until the next bump. The ETag is derived from
+the version, which lets conditional requests be answered with 304
+before the ORM or a serializer is touched.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .rates import rate_table
+
+CACHE_SECONDS = 60 * 60
+
+
+def versioned_etag(name, request):
+    # payloads don't depend on the request, logo URLs are built from
+    # settings.MEDIA_ORIGIN; updated_at guards against a version counter
+    # that was reset
+    key = f"{name}:{rate_table.version}:{rate_table.updated_at}"
+    return '"%s"' % hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def versioned_last_modified(request):
+    return rate_table.updated_at
+
+
+def versioned_json_response(name, request, build):
+    """
+    Render build() once per rate version and serve the cached bytes
+    afterwards.
+    """
+    etag = versioned_etag(name, request)
+    key = f"currency:{name}:{etag}"
+
+    body = cache.get(key)
+    if body is None:
+        body = JSONRenderer().render(build())
+        cache.set(key, body, CACHE_SECONDS)
+
+    response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    return response
@@ -0,0 +1,40 @@
+"""
+Point-in-time rate lookups over RateSnapshot.
+
+Each lookup is a single descending seek on the (code, recorded_at)
+index, so the cost doesn't depend on how much history is stored.
+"""
+from django.utils import timezone
+
+from .models import RateSnapshot
+
+
+def record_snapshots(rates, recorded_at=None):
+    """Append one snapshot per {code: rate_to_base} entry."""
+    recorded_at = recorded_at or timezone.now()
+    return RateSnapshot.objects.bulk_create(
+        [
+            RateSnapshot(code=code, rate_to_base=rate, recorded_at=recorded_at)
+            for code, rate in rates.items()
+        ],
+        batch_size=500
+    )
+
+
+def rate_at(code, when):
+    """rate_to_base of a currency as of `when`, raises RateSnapshot.DoesNotExist."""
+    rate = (
+        RateSnapshot.objects
+        .filter(code=code.upper(), recorded_at__lte=when)
+        .order_by("-recorded_at")
+        .values_list("rate_to_base", flat=True)
+        .first()
+    )
+    if rate is None:
+        raise RateSnapshot.DoesNotExist(f"No rate for {code} at {when}")
+    return rate
+
+
+def cross_rate_at(from_code, to_code, when):
+    """How many units of to_code one unit of from_code bought at `when`."""
+    return rate_at(to_code, when) / rate_at(from_code, when)
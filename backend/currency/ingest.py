@@ -0,0 +1,54 @@
+"""
+Applying a fresh set of rates to the Currency table.
+
+Existing rows are read in one query and only the currencies whose rate
+(or active flag) actually changed are written, in bulk and inside one
+transaction, so readers never see a half-updated table.
+"""
+from collections import namedtuple
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+
+from .history import record_snapshots
+from .models import Currency
+from .rates import bump_version
+
+RATE_PLACES = Decimal("0.0001")
+
+IngestResult = namedtuple("IngestResult", ("created", "updated", "unchanged"))
+
+
+def apply_rates(rates):
+    """Write {code: rate} to the Currency table, returns an IngestResult."""
+    incoming = {
+        code.upper(): Decimal(str(rate)).quantize(RATE_PLACES)
+        for code, rate in rates.items()
+    }
+
+    with db_transaction.atomic():
+        existing = Currency.objects.in_bulk(list(incoming), field_name="code")
+
+        to_create = []
+        to_update = []
+        for code, rate in incoming.items():
+            currency = existing.get(code)
+            if currency is None:
+                to_create.append(Currency(code=code, name=code, rate_to_base=rate, is_active=True))
+            elif currency.rate_to_base != rate or not currency.is_active:
+                currency.rate_to_base = rate
+                currency.is_active = True
+                to_update.append(currency)
+
+        # bulk writes skip the post_save signal, bump the version once instead
+        if to_create or to_update:
+            Currency.objects.bulk_create(to_create, batch_size=500)
+            Currency.objects.bulk_update(to_update, ["rate_to_base", "is_active"], batch_size=500)
+            record_snapshots({c.code: c.rate_to_base for c in to_create + to_update})
+            bump_version()
+
+    return IngestResult(
+        created=len(to_create),
+        updated=len(to_update),
+        unchanged=len(incoming) - len(to_create) - len(to_update)
+    )
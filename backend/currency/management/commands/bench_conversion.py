@@ -0,0 +1,67 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from currency import engine
+
+
+def decimal_convert(amount, from_rate, to_rate):
+    # the Decimal path the views used before the engine
+    amount_in_base = amount / from_rate
+    converted_amount = amount_in_base * to_rate
+    return round(converted_amount, 2)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the conversion engine against the Decimal path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        n = options['iterations']
+
+        samples = [
+            (
+                Decimal(rng.randint(1, 10 ** 9)).scaleb(-2),
+                Decimal(rng.randint(1, 10 ** 9)).scaleb(-4),
+                Decimal(rng.randint(1, 10 ** 9)).scaleb(-4),
+            )
+            for _ in range(n)
+        ]
+        scaled = [
+            (amount, engine.scale_rate(from_rate), engine.scale_rate(to_rate))
+            for amount, from_rate, to_rate in samples
+        ]
+        minor = [
+            (engine.to_minor(amount), int(from_rate), int(to_rate))
+            for amount, from_rate, to_rate in scaled
+        ]
+
+        def timed(fn, rows):
+            started = time.perf_counter()
+            results = [fn(*row) for row in rows]
+            return results, time.perf_counter() - started
+
+        expected, decimal_time = timed(decimal_convert, samples)
+        actual, engine_time = timed(engine.convert, scaled)
+        exact, minor_time = timed(engine.convert_minor, minor)
+
+        mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+        inexact = sum(1 for a, b in zip(actual, exact) if engine.to_minor(a) != b)
+
+        for label, elapsed in (
+            ('Decimal path', decimal_time),
+            ('engine.convert (Decimal in/out)', engine_time),
+            ('engine.convert_minor (minor units)', minor_time),
+        ):
+            self.stdout.write(f'{label:<36} {n / elapsed:>12,.0f} conversions/sec')
+
+        style = self.style.SUCCESS if not mismatches and not inexact else self.style.WARNING
+        self.stdout.write(style(
+            f'{mismatches} of {n} results differ from the Decimal path, '
+            f'{inexact} from the integer path'
+        ))
@@ -1,45 +1,86 @@
-import requests
-from django.core.management.base import BaseCommand
-from currency.models import Currency
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from currency.ingest import apply_rates
+from currency.providers import (
+    MERGE_STRATEGIES, RateFetchError, build_session, fetch_rates, get_provider
+)
 
 class Command(BaseCommand):
     help = 'Update currency rates from external API'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--provider', action='append', dest='providers',
+            help='Provider name, file:<path> or URL. Repeat to query several at once.'
+        )
+        parser.add_argument('--merge', choices=MERGE_STRATEGIES, default='median')
+        parser.add_argument('--timeout', type=float, default=5, help='Per-provider timeout in seconds')
+        parser.add_argument('--daemon', action='store_true', help='Keep refreshing until interrupted')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between refreshes in daemon mode')
+
     def handle(self, *args, **options):
+        specs = options['providers'] or settings.RATE_PROVIDERS
         try:
-            # Using exchangerate-api.com (free tier)
-            response = requests.get('https://api.exchangerate-api.com/v4/latest/USD')
-            response.raise_for_status()
-            data = response.json()
-
-            rates = data['rates']
-            updated_count = 0
-
-            for code, rate in rates.items():
-                currency, created = Currency.objects.update_or_create(
-                    code=code.upper(),
-                    defaults={
-                        'rate_to_base': rate,
-                        'is_active': True,
-                        'name': code.upper()  # Simple name, can be improved
-                    }
-                )
-                if not created:
-                    updated_count += 1
-                else:
-                    self.stdout.write(f'Created currency: {code}')
+            providers = [get_provider(spec) for spec in specs]
+        except ValueError as e:
+            raise CommandError(e)
+
+        # one session, so daemon mode keeps its connections alive, and one
+        # pool, so a stalled provider holds one thread rather than leaving
+        # another behind every refresh
+        session = build_session(pool_size=len(providers))
+        pool = ThreadPoolExecutor(max_workers=len(providers))
+
+        try:
+            if not options['daemon']:
+                self.refresh(providers, session, pool, options)
+                return
+
+            while True:
+                started = time.monotonic()
+                close_old_connections()
+                self.refresh(providers, session, pool, options)
+                time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            session.close()
+
+    def refresh(self, providers, session, pool, options):
+        try:
+            started = time.monotonic()
+            rates, errors = fetch_rates(
+                providers, session,
+                timeout=options['timeout'],
+                strategy=options['merge'],
+                pool=pool
+            )
+            fetched_ms = (time.monotonic() - started) * 1000
+
+            for name, error in errors.items():
+                self.stdout.write(self.style.WARNING(f'Provider {name} failed: {error}'))
+
+            started = time.monotonic()
+            result = apply_rates(rates)
+            elapsed_ms = (time.monotonic() - started) * 1000
 
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'Successfully updated {updated_count} currencies and created {len(rates) - updated_count} new ones'
+                    f'Updated {result.updated} currencies, created {result.created} new ones, '
+                    f'{result.unchanged} unchanged (fetch {fetched_ms:.1f} ms, write {elapsed_ms:.1f} ms)'
                 )
             )
 
-        except requests.RequestException as e:
+        except RateFetchError as e:
             self.stdout.write(
                 self.style.ERROR(f'Failed to fetch rates: {e}')
             )
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error updating rates: {e}')
-            )
\ No newline at end of file
+            )
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
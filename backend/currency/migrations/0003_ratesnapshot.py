@@ -0,0 +1,26 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0002_rateversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=10)),
+                ('rate_to_base', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['code', 'recorded_at'], name='rate_snapshot_code_time_idx')],
+            },
+        ),
+    ]
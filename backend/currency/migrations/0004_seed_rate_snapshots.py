@@ -0,0 +1,31 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def seed_snapshots(apps, schema_editor):
+    # rate ingestion only snapshots rates it changes, so a currency whose
+    # rate never moves needs an opening snapshot for rate history to find it
+    Currency = apps.get_model("currency", "Currency")
+    RateSnapshot = apps.get_model("currency", "RateSnapshot")
+
+    recorded = set(RateSnapshot.objects.values_list("code", flat=True).distinct())
+    now = timezone.now()
+    RateSnapshot.objects.bulk_create(
+        [
+            RateSnapshot(code=code, rate_to_base=rate, recorded_at=now)
+            for code, rate in Currency.objects.values_list("code", "rate_to_base")
+            if code not in recorded
+        ],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency', '0003_ratesnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Currency(models.Model):
@@ -15,3 +16,34 @@ class Currency(models.Model):
 
     def __str__(self):
         return f"{self.code} - {self.name}"
+
+
+class RateVersion(models.Model):
+    """
+    Single-row counter bumped whenever a Currency changes.
+    Workers compare it against their in-memory rate table to know
+    when to reload.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"v{self.version}"
+
+
+class RateSnapshot(models.Model):
+    """
+    Append-only history of rate_to_base. Rows are never updated,
+    the (code, recorded_at) index serves as-of lookups.
+    """
+    code = models.CharField(max_length=10)
+    rate_to_base = models.DecimalField(max_digits=10, decimal_places=4)
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["code", "recorded_at"], name="rate_snapshot_code_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.code} {self.rate_to_base} @ {self.recorded_at}"
@@ -0,0 +1,165 @@
+"""
+Rate providers and the concurrent fetcher used by update_rates.
+
+A provider returns {code: rate} relative to USD. fetch_rates() asks
+several providers at once, each bounded by its own timeout, and merges
+whatever came back. HTTP fetches stop at their deadline too, so a
+stalled provider gives its thread back instead of holding it forever;
+daemon mode runs every refresh on one pool for its whole lifetime.
+"""
+import json
+import statistics
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from decimal import Decimal
+
+import requests
+from requests.adapters import HTTPAdapter
+
+MERGE_STRATEGIES = ("median", "priority")
+
+FetchResult = namedtuple("FetchResult", ("rates", "errors"))
+
+
+class RateFetchError(Exception):
+    pass
+
+
+class RateProvider(ABC):
+    name = None
+
+    @abstractmethod
+    def fetch(self, session, timeout):
+        """Return {code: rate} relative to USD within `timeout` seconds."""
+
+
+class HTTPProvider(RateProvider):
+    """Any endpoint answering {"rates": {code: rate}} with USD as base."""
+
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+
+    def fetch(self, session, timeout):
+        # the requests timeout bounds the connect and each read, the
+        # deadline a server trickling its body a byte at a time
+        deadline = time.monotonic() + timeout
+        with session.get(self.url, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            body = bytearray()
+            for chunk in response.iter_content(8192):
+                if time.monotonic() > deadline:
+                    raise RateFetchError("timed out")
+                body += chunk
+        return json.loads(body)["rates"]
+
+
+class FileProvider(RateProvider):
+    """Reads rates from a local JSON file, for offline runs and tests."""
+
+    def __init__(self, path):
+        self.name = f"file:{path}"
+        self.path = path
+
+    def fetch(self, session, timeout):
+        with open(self.path) as f:
+            data = json.load(f)
+        return data.get("rates", data)
+
+
+PROVIDERS = {
+    "exchangerate-api": lambda: HTTPProvider(
+        "exchangerate-api", "https://api.exchangerate-api.com/v4/latest/USD"
+    ),
+    "open-er-api": lambda: HTTPProvider(
+        "open-er-api", "https://open.er-api.com/v6/latest/USD"
+    ),
+}
+
+
+def get_provider(spec):
+    """Build a provider from a registry name, `file:<path>` or an http(s) URL."""
+    if spec.startswith("file:"):
+        return FileProvider(spec[len("file:"):])
+    if spec.startswith(("http://", "https://")):
+        return HTTPProvider(spec, spec)
+    try:
+        return PROVIDERS[spec]()
+    except KeyError:
+        raise ValueError(f"Unknown rate provider: {spec}")
+
+
+def build_session(pool_size=10):
+    """One keep-alive session, reused across refreshes in daemon mode."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def merge_rates(results, strategy="median"):
+    """
+    Merge provider results given in priority order. "median" takes the
+    median of every provider quoting a code, "priority" the first one.
+    """
+    merged = {}
+    if strategy == "priority":
+        for rates in reversed(results):
+            merged.update(rates)
+        return merged
+
+    quotes = {}
+    for rates in results:
+        for code, rate in rates.items():
+            quotes.setdefault(code, []).append(rate)
+    for code, values in quotes.items():
+        merged[code] = statistics.median(values)
+    return merged
+
+
+def fetch_rates(providers, session, timeout=5, strategy="median", pool=None):
+    """
+    Query providers concurrently, returns a FetchResult. Callers that
+    refresh repeatedly pass a pool sized to the providers and reuse it.
+    """
+    if strategy not in MERGE_STRATEGIES:
+        raise ValueError(f"Unknown merge strategy: {strategy}")
+
+    owned = pool is None
+    if owned:
+        pool = ThreadPoolExecutor(max_workers=len(providers))
+    try:
+        futures = [pool.submit(p.fetch, session, timeout) for p in providers]
+        # a provider that stalls past its timeout is dropped, not waited for
+        wait(futures, timeout=timeout)
+        # fetches still queued behind a stalled one aren't worth starting
+        for future in futures:
+            future.cancel()
+    finally:
+        if owned:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    errors = {}
+    for provider, future in zip(providers, futures):
+        if future.cancelled() or not future.done():
+            errors[provider.name] = "timed out"
+            continue
+        try:
+            rates = future.result()
+            results.append({
+                code.upper(): Decimal(str(rate))
+                for code, rate in rates.items()
+            })
+        except Exception as e:
+            errors[provider.name] = str(e)
+
+    if not results:
+        raise RateFetchError(
+            "; ".join(f"{name}: {error}" for name, error in errors.items())
+        )
+
+    return FetchResult(merge_rates(results, strategy), errors)
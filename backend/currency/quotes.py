@@ -0,0 +1,103 @@
+"""
+Time-limited conversion quotes.
+
+A quote locks the scaled rates of a currency pair for one amount until
+it expires. Quotes only live in the cache, stored as a small tuple of
+ints and strings with the cache timeout doing the eviction, so issuing
+one costs no database write. A quote belongs to the user it was issued
+to and can be consumed once.
+"""
+import secrets
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import engine
+from .rates import rate_table
+
+
+class Quote(namedtuple(
+    "Quote",
+    "id user_id from_currency to_currency amount from_rate to_rate expires_at"
+)):
+    __slots__ = ()
+
+    @property
+    def converted(self):
+        return engine.convert(self.amount, self.from_rate, self.to_rate)
+
+
+class QuoteNotFound(Exception):
+    """Unknown, expired, already used or issued to someone else."""
+
+
+def _key(quote_id):
+    return f"quote:{quote_id}"
+
+
+def _store(quote, timeout):
+    cache.set(
+        _key(quote.id),
+        (quote.user_id, quote.from_currency, quote.to_currency,
+         engine.to_minor(quote.amount), int(quote.from_rate), int(quote.to_rate), quote.expires_at),
+        timeout=timeout
+    )
+
+
+def issue(user, from_code, to_code, amount):
+    """Lock the current rates for a conversion. Raises Currency.DoesNotExist."""
+    quote = Quote(
+        id=secrets.token_urlsafe(12),
+        user_id=user.pk,
+        from_currency=from_code,
+        to_currency=to_code,
+        amount=amount,
+        from_rate=rate_table.get_scaled(from_code),
+        to_rate=rate_table.get_scaled(to_code),
+        expires_at=time.time() + settings.QUOTE_TTL
+    )
+    _store(quote, settings.QUOTE_TTL)
+    return quote
+
+
+def consume(quote_id, user):
+    """Take a quote out of the store for execution. Raises QuoteNotFound."""
+    stored = cache.get(_key(quote_id))
+    if stored is None:
+        raise QuoteNotFound(quote_id)
+
+    user_id, from_code, to_code, amount_minor, from_rate, to_rate, expires_at = stored
+    if user_id != user.pk or expires_at <= time.time():
+        raise QuoteNotFound(quote_id)
+    # delete() reports whether the key was there, so only one request wins
+    if not cache.delete(_key(quote_id)):
+        raise QuoteNotFound(quote_id)
+
+    return load((quote_id, user_id, from_code, to_code, amount_minor, from_rate, to_rate, expires_at))
+
+
+def dump(quote):
+    """A quote as JSON-safe values, for callers that release it later."""
+    return [
+        quote.id, quote.user_id, quote.from_currency, quote.to_currency,
+        engine.to_minor(quote.amount), int(quote.from_rate), int(quote.to_rate), quote.expires_at
+    ]
+
+
+def load(values):
+    """The inverse of dump()."""
+    quote_id, user_id, from_code, to_code, amount_minor, from_rate, to_rate, expires_at = values
+    return Quote(
+        quote_id, user_id, from_code, to_code,
+        engine.from_minor(amount_minor), Decimal(from_rate), Decimal(to_rate), expires_at
+    )
+
+
+def release(quote):
+    """Put back a consumed quote whose execution failed, if it hasn't expired."""
+    remaining = quote.expires_at - time.time()
+    if remaining > 0:
+        _store(quote, remaining)
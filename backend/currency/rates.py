@@ -0,0 +1,164 @@
+"""
+Process-local rate table.
+
+Every worker keeps the active currency rates in a dict so conversions
+don't hit the database. The table checks the shared RateVersion counter
+at most once every RATE_CACHE_TTL seconds and reloads itself when the
+version moved, so a rate change reaches every worker within that window.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .engine import scale_rate
+from .models import Currency, RateVersion
+
+
+def current_version():
+    """(version, updated_at) of the rate table, (0, None) before any change."""
+    row = RateVersion.objects.filter(pk=1).values_list("version", "updated_at").first()
+    return row or (0, None)
+
+
+def bump_version():
+    """Mark the rates as changed for every worker."""
+    updated = RateVersion.objects.filter(pk=1).update(
+        version=F("version") + 1,
+        updated_at=timezone.now()
+    )
+    if not updated:
+        RateVersion.objects.get_or_create(pk=1, defaults={"version": 1})
+
+    # this process doesn't need to wait for the TTL
+    rate_table.invalidate()
+
+
+# serialized cross-rate matrix for one rate version
+RateMatrix = namedtuple("RateMatrix", ("version", "body", "etag"))
+
+
+def build_matrix(rates):
+    """
+    Outer division of the rate vector: cell [i][j] is how many units of
+    currency j one unit of currency i buys. Values keep 6 significant
+    digits, rate_to_base itself only has 4 decimal places.
+    """
+    codes = sorted(code for code, rate in rates.items() if rate > 0)
+    vector = [float(rates[code]) for code in codes]
+
+    matrix = [
+        [float(f"{to_rate / from_rate:.6g}") for to_rate in vector]
+        for from_rate in vector
+    ]
+    return codes, matrix
+
+
+class RateTable:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rates = {}
+        self._scaled = {}
+        self._version = None
+        self._updated_at = None
+        self._checked_at = 0.0
+        self._matrix = None
+
+    def _is_fresh(self):
+        ttl = getattr(settings, "RATE_CACHE_TTL", 5)
+        return (
+            self._version is not None
+            and time.monotonic() - self._checked_at < ttl
+        )
+
+    def refresh(self):
+        if self._is_fresh():
+            return
+
+        with self._lock:
+            if self._is_fresh():
+                return
+
+            version, updated_at = current_version()
+            if version != self._version:
+                # read the version first: a change landing in between only
+                # causes one extra reload on the next check
+                self._rates = dict(
+                    Currency.objects.filter(is_active=True)
+                    .values_list("code", "rate_to_base")
+                )
+                self._scaled = {code: scale_rate(rate) for code, rate in self._rates.items()}
+                self._version = version
+                self._updated_at = updated_at
+                self._matrix = None
+            self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._matrix = None
+
+    @property
+    def version(self):
+        self.refresh()
+        return self._version
+
+    @property
+    def updated_at(self):
+        """When the rates last changed, None if they never did."""
+        self.refresh()
+        return self._updated_at
+
+    def rates(self):
+        """Return the current {code: rate_to_base} mapping (do not mutate)."""
+        self.refresh()
+        return self._rates
+
+    def scaled_rates(self):
+        """Return the current {code: rate} mapping in engine fixed point."""
+        self.refresh()
+        return self._scaled
+
+    def snapshot(self):
+        """Return (version, rates) read together."""
+        self.refresh()
+        with self._lock:
+            return self._version, self._rates
+
+    def matrix(self):
+        """Cross-rate matrix, built and serialized once per rate version."""
+        version, rates = self.snapshot()
+
+        matrix = self._matrix
+        if matrix is None or matrix.version != version:
+            codes, rows = build_matrix(rates)
+            body = json.dumps(
+                {"version": version, "currencies": codes, "rates": rows},
+                separators=(",", ":")
+            ).encode()
+            etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+            self._matrix = matrix = RateMatrix(version, body, etag)
+
+        return matrix
+
+    def get(self, code):
+        """Rate of an active currency, raises Currency.DoesNotExist otherwise."""
+        try:
+            return self.rates()[code.upper()]
+        except KeyError:
+            raise Currency.DoesNotExist(f"Currency {code} not found")
+
+    def get_scaled(self, code):
+        """Like get(), in engine fixed point."""
+        try:
+            return self.scaled_rates()[code.upper()]
+        except KeyError:
+            raise Currency.DoesNotExist(f"Currency {code} not found")
+
+
+rate_table = RateTable()
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Currency
 
@@ -10,9 +11,10 @@ class CurrencySerializer(serializers.ModelSerializer):
         fields = ("code", "name", "rate_to_base", "logo_url")
 
     def get_logo_url(self, obj):
-        request = self.context.get("request")
-        if obj.logo and request:
-            return request.build_absolute_uri(obj.logo.url)
+        # the same for every request, so cached payloads can't carry a
+        # host someone put in a Host header
+        if obj.logo:
+            return f"{settings.MEDIA_ORIGIN}{obj.logo.url}"
         return None
     
 class CurrencyConvertSerializer(serializers.Serializer):
@@ -20,3 +22,60 @@ class CurrencyConvertSerializer(serializers.Serializer):
     to_currency = serializers.CharField()
     amount = serializers.DecimalField(max_digits=12, decimal_places=2)
 
+
+class QuoteSerializer(CurrencyConvertSerializer):
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be greater than zero")
+        return value
+
+
+class CurrencyBatchConvertSerializer(serializers.Serializer):
+    """
+    Either a list of items, or one amount fanned out to several
+    target currencies.
+    """
+    MAX_ITEMS = 500
+
+    items = CurrencyConvertSerializer(many=True, required=False)
+    from_currency = serializers.CharField(required=False)
+    to_currencies = serializers.ListField(
+        child=serializers.CharField(),
+        required=False
+    )
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+
+    def validate(self, data):
+        if "items" in data:
+            items = [
+                (item["from_currency"].upper(), item["to_currency"].upper(), item["amount"])
+                for item in data["items"]
+            ]
+        elif all(k in data for k in ("from_currency", "to_currencies", "amount")):
+            from_code = data["from_currency"].upper()
+            items = [
+                (from_code, to_code.upper(), data["amount"])
+                for to_code in data["to_currencies"]
+            ]
+        else:
+            raise serializers.ValidationError(
+                "Provide either items or from_currency, to_currencies and amount"
+            )
+
+        if not items:
+            raise serializers.ValidationError("Nothing to convert")
+        if len(items) > self.MAX_ITEMS:
+            raise serializers.ValidationError(
+                f"At most {self.MAX_ITEMS} conversions per request"
+            )
+
+        data["conversions"] = items
+        return data
+
+
+class RateHistorySerializer(serializers.Serializer):
+    from_currency = serializers.CharField()
+    to_currency = serializers.CharField()
+    at = serializers.DateTimeField(required=False)
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .history import record_snapshots
+from .models import Currency
+from .rates import bump_version
+
+
+@receiver(pre_save, sender=Currency)
+def remember_rate(sender, instance, update_fields=None, **kwargs):
+    # the stored rate, so post_save can tell whether this save changed it
+    instance._previous_rate = None
+    if instance.pk and (update_fields is None or "rate_to_base" in update_fields):
+        instance._previous_rate = (
+            Currency.objects.filter(pk=instance.pk).values_list("rate_to_base", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Currency)
+def record_rate_change(sender, instance, created, update_fields=None, **kwargs):
+    # saves from the admin or code; apply_rates bulk-writes and records its own
+    if update_fields is not None and "rate_to_base" not in update_fields:
+        return
+    if created or instance._previous_rate != instance.rate_to_base:
+        record_snapshots({instance.code: instance.rate_to_base})
+
+
+@receiver(post_save, sender=Currency)
+@receiver(post_delete, sender=Currency)
+def currency_changed(sender, **kwargs):
+    bump_version()
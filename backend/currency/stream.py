@@ -0,0 +1,204 @@
+"""
+Server-sent events for rate changes, served straight from the ASGI app.
+
+One RateBroadcaster per process polls the rate table and encodes each
+change once. Subscribers hold nothing but the id of the last event they
+sent and wait on a shared asyncio.Event, so an idle connection costs a
+parked coroutine rather than a queue of its own.
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .rates import rate_table
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = "/api/stream/rates/"
+HEARTBEAT_SECONDS = 15
+HEARTBEAT = b": keep-alive\n\n"
+
+
+def encode_event(event_id, event, data):
+    payload = json.dumps(data, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode()
+
+
+class RateBroadcaster:
+    def __init__(self, interval=None):
+        self.interval = interval
+        self.event_id = 0
+        self.snapshot = b""
+        self.update = b""
+        self.subscribers = 0
+        self._rates = None
+        self._version = None
+        self._next = asyncio.Event()
+        self._ready = None
+        self._task = None
+
+    def publish(self, version, rates):
+        """Record the latest rates, returns True when an event was produced."""
+        if self._rates is not None and version == self._version:
+            return False
+        self._version = version
+
+        previous = self._rates or {}
+        changed = {
+            code: str(rate)
+            for code, rate in rates.items()
+            if previous.get(code) != rate
+        }
+        removed = [code for code in previous if code not in rates]
+        if self._rates is not None and not changed and not removed:
+            return False
+
+        self._rates = dict(rates)
+        self.event_id += 1
+        self.snapshot = encode_event(self.event_id, "snapshot", {
+            "version": version,
+            "rates": {code: str(rate) for code, rate in rates.items()},
+        })
+        self.update = encode_event(self.event_id, "update", {
+            "version": version,
+            "rates": changed,
+            "removed": removed,
+        })
+        return True
+
+    async def poll(self):
+        version, rates = await sync_to_async(rate_table.snapshot)()
+        if self.publish(version, rates):
+            waiter, self._next = self._next, asyncio.Event()
+            waiter.set()
+
+    def _start(self):
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        interval = self.interval or getattr(settings, "RATE_STREAM_INTERVAL", 1)
+        try:
+            # the poller only lives while somebody is listening
+            while self.subscribers:
+                try:
+                    await self.poll()
+                except Exception:
+                    logger.exception("Rate stream poll failed")
+                self._ready.set()
+                await asyncio.sleep(interval)
+        finally:
+            self._task = None
+
+    async def subscribe(self):
+        """Yield encoded events: a full snapshot first, then only changes."""
+        self.subscribers += 1
+        try:
+            self._start()
+            await self._ready.wait()
+
+            last = self.event_id
+            yield self.snapshot
+
+            while True:
+                if self.event_id == last:
+                    try:
+                        await asyncio.wait_for(self._next.wait(), HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield HEARTBEAT
+                        continue
+                # a subscriber that missed an event gets the full table again
+                yield self.update if self.event_id == last + 1 else self.snapshot
+                last = self.event_id
+        finally:
+            self.subscribers -= 1
+
+
+broadcaster = RateBroadcaster()
+
+
+def _get_token(scope):
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            parts = value.decode().split()
+            if len(parts) == 2 and parts[0] in settings.SIMPLE_JWT["AUTH_HEADER_TYPES"]:
+                return parts[1]
+    # EventSource can't set headers, so the token may come in the query string
+    query = parse_qs(scope.get("query_string", b"").decode())
+    return query.get("token", [None])[0]
+
+
+def _is_authenticated(scope):
+    token = _get_token(scope)
+    if not token:
+        return False
+    try:
+        # the user checks the REST API makes: the account exists and is active
+        JWTAuthentication().get_user(AccessToken(token))
+    except (TokenError, AuthenticationFailed):
+        return False
+    return True
+
+
+class RateStreamApp:
+    """
+    ASGI wrapper answering STREAM_PATH itself and passing every other
+    request on to Django, so streams skip the middleware and view stack.
+    """
+
+    def __init__(self, app, broadcaster=broadcaster):
+        self.app = app
+        self.broadcaster = broadcaster
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != STREAM_PATH:
+            return await self.app(scope, receive, send)
+
+        if not await sync_to_async(_is_authenticated)(scope):
+            await send({
+                "type": "http.response.start",
+                "status": 401,
+                "headers": [(b"content-type", b"application/json")],
+            })
+            await send({
+                "type": "http.response.body",
+                "body": b'{"detail":"Authentication credentials were not provided."}',
+            })
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+
+        events = self.broadcaster.subscribe()
+        disconnected = asyncio.create_task(self._wait_for_disconnect(receive))
+        try:
+            # a dropped client is noticed at the next event or heartbeat
+            async for chunk in events:
+                if disconnected.done():
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        except OSError:
+            pass
+        finally:
+            disconnected.cancel()
+            await events.aclose()
+
+    async def _wait_for_disconnect(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
@@ -1,8 +1,29 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import ROUND_DOWN, Decimal, localcontext
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from django.apps import apps
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
-from .models import Currency
+from . import engine
+from .history import record_snapshots, rate_at
+from .ingest import apply_rates
+from .models import Currency, RateSnapshot
+from .providers import RateFetchError, RateProvider, fetch_rates
+from .rates import rate_table
+from .stream import STREAM_PATH, RateBroadcaster, RateStreamApp, _is_authenticated
 
 User = get_user_model()
 
@@ -26,3 +47,324 @@ class CurrencyConversionTest(APITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['converted_amount'], 830.0)  # 10 * 83
+
+    def test_conversion_served_from_rate_table(self):
+        url = '/api/convert/'
+        data = {'from_currency': 'USD', 'to_currency': 'INR', 'amount': 10}
+        self.client.post(url, data, format='json')
+
+        with self.assertNumQueries(0):
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.data['converted_amount'], 830.0)
+
+    def test_rate_change_invalidates_table(self):
+        self.assertEqual(rate_table.get('INR'), 83)
+
+        self.inr.rate_to_base = 84
+        self.inr.save()
+
+        self.assertEqual(rate_table.get('INR'), 84)
+
+    def test_batch_conversion(self):
+        url = '/api/convert/batch/'
+        data = {
+            'items': [
+                {'from_currency': 'USD', 'to_currency': 'INR', 'amount': 10},
+                {'from_currency': 'inr', 'to_currency': 'usd', 'amount': 166},
+            ]
+        }
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['converted_amount'] for r in response.data['results']],
+            [830.0, 2.0]
+        )
+
+    def test_batch_conversion_fan_out(self):
+        url = '/api/convert/batch/'
+        data = {'from_currency': 'USD', 'to_currencies': ['INR', 'USD'], 'amount': 2}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['converted_amount'] for r in response.data['results']],
+            [166.0, 2.0]
+        )
+
+    def test_batch_conversion_rejects_unknown_codes(self):
+        url = '/api/convert/batch/'
+        data = {'from_currency': 'USD', 'to_currencies': ['INR', 'XXX'], 'amount': 2}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['invalid_codes'], ['XXX'])
+
+    def test_rate_matrix(self):
+        response = self.client.get('/api/rates/matrix/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        data = response.json()
+        self.assertEqual(data['currencies'], ['INR', 'USD'])
+        self.assertEqual(data['rates'], [[1.0, 0.0120482], [83.0, 1.0]])
+
+        with mock.patch.object(rate_table, 'matrix', wraps=rate_table.matrix) as matrix:
+            cached = self.client.get('/api/rates/matrix/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        matrix.assert_called_once()
+
+        self.inr.rate_to_base = 84
+        self.inr.save()
+        changed = self.client.get('/api/rates/matrix/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+
+    def test_currency_list_conditional_get(self):
+        url = '/api/currencies/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([c['code'] for c in response.json()], ['USD', 'INR'])
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.usd.name = 'Dollar'
+        self.usd.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertEqual(changed.json()[0]['name'], 'Dollar')
+
+    @override_settings(MEDIA_ORIGIN='https://api.example.com')
+    def test_logo_urls_ignore_the_host_header(self):
+        self.usd.logo = 'currency_logos/usd.png'
+        self.usd.save()
+
+        response = self.client.get('/api/currencies/')
+        spoofed = self.client.get('/api/currencies/', HTTP_HOST='attacker.example')
+        self.assertEqual(spoofed['ETag'], response['ETag'])
+        self.assertEqual(spoofed.json()[0]['logo_url'], 'https://api.example.com/media/currency_logos/usd.png')
+
+
+class RateHistoryTest(APITestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        record_snapshots({'USD': 1, 'INR': 80}, recorded_at=self.now - timedelta(days=2))
+        record_snapshots({'USD': 1, 'INR': 83}, recorded_at=self.now - timedelta(days=1))
+
+        self.user = User.objects.create_user(email='test@example.com', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+    def test_rate_at(self):
+        self.assertEqual(rate_at('INR', self.now - timedelta(hours=36)), 80)
+        self.assertEqual(rate_at('inr', self.now), 83)
+        with self.assertRaises(RateSnapshot.DoesNotExist):
+            rate_at('INR', self.now - timedelta(days=3))
+
+    def test_history_endpoint(self):
+        url = '/api/rates/history/'
+        at = (self.now - timedelta(hours=36)).isoformat()
+        response = self.client.get(url, {'from_currency': 'USD', 'to_currency': 'INR', 'at': at, 'amount': '10'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rate'], Decimal('80'))
+        self.assertEqual(response.data['converted_amount'], Decimal('800'))
+
+        response = self.client.get(url, {'from_currency': 'USD', 'to_currency': 'XXX'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_saving_a_rate_records_a_snapshot(self):
+        inr = Currency.objects.create(code='INR', name='Indian Rupee', rate_to_base=Decimal('84'))
+        self.assertEqual(rate_at('INR', timezone.now()), 84)
+
+        inr.rate_to_base = Decimal('90')
+        inr.save()
+        inr.name = 'Rupee'
+        inr.save()
+
+        self.assertEqual(rate_at('INR', timezone.now()), 90)
+        self.assertEqual(RateSnapshot.objects.filter(code='INR', rate_to_base=Decimal('90')).count(), 1)
+
+    def test_existing_currencies_get_an_opening_snapshot(self):
+        Currency.objects.create(code='EUR', name='Euro', rate_to_base=Decimal('0.92'))
+        RateSnapshot.objects.filter(code='EUR').delete()
+
+        seed = import_module('currency.migrations.0004_seed_rate_snapshots').seed_snapshots
+        seed(apps, None)
+
+        self.assertEqual(rate_at('EUR', timezone.now()), Decimal('0.92'))
+        self.assertEqual(RateSnapshot.objects.filter(code='INR').count(), 2)
+
+
+
+class RateIngestTest(TestCase):
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', rate_to_base=1.0)
+        Currency.objects.create(code='INR', name='Indian Rupee', rate_to_base=83.0)
+
+    def test_only_changed_rows_are_written(self):
+        result = apply_rates({'USD': 1, 'INR': 83.0})
+        self.assertEqual(result, (0, 0, 2))
+        # only the opening snapshots from creating the currencies
+        self.assertEqual(RateSnapshot.objects.count(), 2)
+
+        result = apply_rates({'usd': 1, 'INR': 83.12346, 'EUR': 0.92})
+        self.assertEqual(result, (1, 1, 1))
+
+        self.assertEqual(Currency.objects.get(code='INR').rate_to_base, Decimal('83.1235'))
+        self.assertEqual(Currency.objects.get(code='INR').name, 'Indian Rupee')
+        self.assertEqual(rate_table.get('EUR'), Decimal('0.92'))
+        self.assertEqual(
+            sorted(RateSnapshot.objects.values_list('code', flat=True)),
+            ['EUR', 'INR', 'INR', 'USD']
+        )
+
+
+class UpdateRatesCommandTest(TestCase):
+    stub = os.path.join(os.path.dirname(__file__), 'stub_rates.json')
+
+    def test_update_from_stub_provider(self):
+        out = StringIO()
+        call_command('update_rates', '--provider', f'file:{self.stub}', stdout=out)
+
+        self.assertIn('created 5 new ones', out.getvalue())
+        self.assertEqual(Currency.objects.get(code='INR').rate_to_base, Decimal('83.12'))
+
+    def test_providers_are_merged(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'rates': {'INR': 84, 'CHF': 0.88}}, f)
+        self.addCleanup(os.remove, f.name)
+        missing = os.path.join(tempfile.gettempdir(), 'missing-rates.json')
+
+        out = StringIO()
+        call_command(
+            'update_rates',
+            '--provider', f'file:{self.stub}',
+            '--provider', f'file:{f.name}',
+            '--provider', f'file:{missing}',
+            stdout=out
+        )
+
+        self.assertIn('failed', out.getvalue())
+        # median of two quotes, single quotes pass through
+        self.assertEqual(Currency.objects.get(code='INR').rate_to_base, Decimal('83.56'))
+        self.assertEqual(Currency.objects.get(code='CHF').rate_to_base, Decimal('0.88'))
+
+
+class StalledProvider(RateProvider):
+    name = 'stalled'
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def fetch(self, session, timeout):
+        self.release.wait()
+        return {}
+
+
+class FetchRatesTest(SimpleTestCase):
+    def test_providers_must_implement_fetch(self):
+        with self.assertRaises(TypeError):
+            RateProvider()
+
+    def test_stalled_provider_holds_one_pooled_thread(self):
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        stalled = StalledProvider()
+        self.addCleanup(stalled.release.set)
+
+        before = threading.active_count()
+        for _ in range(3):
+            with self.assertRaisesMessage(RateFetchError, 'stalled: timed out'):
+                fetch_rates([stalled], None, timeout=0.01, pool=pool)
+        self.assertEqual(threading.active_count(), before + 1)
+
+
+class StaticBroadcaster(RateBroadcaster):
+    """Publishes queued rate states instead of reading the database."""
+
+    def __init__(self, states):
+        super().__init__(interval=0.01)
+        self.states = list(states)
+
+    async def poll(self):
+        if self.states and self.publish(*self.states.pop(0)):
+            waiter, self._next = self._next, asyncio.Event()
+            waiter.set()
+
+
+class RateStreamTest(SimpleTestCase):
+    def test_publish_sends_only_changes(self):
+        broadcaster = RateBroadcaster()
+        self.assertTrue(broadcaster.publish(1, {'USD': Decimal('1'), 'INR': Decimal('83')}))
+        self.assertFalse(broadcaster.publish(1, {'USD': Decimal('1'), 'INR': Decimal('84')}))
+        self.assertTrue(broadcaster.publish(2, {'USD': Decimal('1'), 'INR': Decimal('84')}))
+
+        self.assertIn(b'"rates":{"INR":"84"}', broadcaster.update)
+        self.assertIn(b'"USD":"1"', broadcaster.snapshot)
+
+    def test_subscriber_gets_snapshot_then_updates(self):
+        broadcaster = StaticBroadcaster([
+            (1, {'USD': Decimal('1'), 'INR': Decimal('83')}),
+            (2, {'USD': Decimal('1'), 'INR': Decimal('84')}),
+        ])
+
+        async def read_two():
+            events = broadcaster.subscribe()
+            try:
+                return [await events.__anext__(), await events.__anext__()]
+            finally:
+                await events.aclose()
+
+        snapshot, update = asyncio.run(read_two())
+        self.assertTrue(snapshot.startswith(b'id: 1\nevent: snapshot'))
+        self.assertTrue(update.startswith(b'id: 2\nevent: update'))
+        self.assertEqual(broadcaster.subscribers, 0)
+
+    def test_stream_requires_token(self):
+        messages = []
+
+        async def app(scope, receive, send):
+            raise AssertionError('stream path must not reach Django')
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'path': STREAM_PATH, 'headers': [], 'query_string': b''}
+        asyncio.run(RateStreamApp(app)(scope, None, send))
+        self.assertEqual(messages[0]['status'], 401)
+
+
+class RateStreamAuthTest(TestCase):
+    def test_stream_rejects_inactive_and_deleted_users(self):
+        user = User.objects.create_user(email='me@example.com', password='testpass')
+        scope = {'headers': [], 'query_string': f'token={AccessToken.for_user(user)}'.encode()}
+        self.assertTrue(_is_authenticated(scope))
+
+        user.is_active = False
+        user.save()
+        self.assertFalse(_is_authenticated(scope))
+
+        user.delete()
+        self.assertFalse(_is_authenticated(scope))
+
+
+class ConversionEngineTest(SimpleTestCase):
+    def test_scaling(self):
+        self.assertEqual(engine.scale_rate(Decimal('83.1234')), 831234)
+        self.assertEqual(engine.to_minor(Decimal('10.5')), 1050)
+        self.assertEqual(engine.from_minor(83000), Decimal('830.00'))
+
+    def test_convert(self):
+        usd, inr = engine.scale_rate(1), engine.scale_rate(83)
+        self.assertEqual(engine.convert(Decimal('10'), usd, inr), Decimal('830.00'))
+        self.assertEqual(engine.convert(Decimal('100'), inr, usd), Decimal('1.20'))
+
+    def test_rounds_half_to_even(self):
+        one, half = engine.scale_rate(1), engine.scale_rate(Decimal('0.5'))
+        self.assertEqual(engine.convert(Decimal('0.01'), one, half), Decimal('0.00'))
+        self.assertEqual(engine.convert(Decimal('0.03'), one, half), Decimal('0.02'))
+
+    def test_ignores_the_thread_decimal_context(self):
+        usd, inr = engine.scale_rate(1), engine.scale_rate(Decimal('83.1234'))
+        expected = engine.convert(Decimal('12345.67'), inr, usd)
+        with localcontext(prec=6, rounding=ROUND_DOWN):
+            self.assertEqual(engine.scale_rate(Decimal('83.1234')), inr)
+            self.assertEqual(engine.convert(Decimal('12345.67'), inr, usd), expected)
@@ -1,7 +1,13 @@
 from django.urls import path
-from .views import currency_list, convert_currency
+from .views import (
+    currency_list, convert_currency, convert_currency_batch, create_quote, rate_matrix, rate_history
+)
 
 urlpatterns = [
     path("currencies/", currency_list),
     path("convert/", convert_currency),
+    path("convert/batch/", convert_currency_batch),
+    path("quotes/", create_quote),
+    path("rates/matrix/", rate_matrix),
+    path("rates/history/", rate_history),
 ]
@@ -1,24 +1,55 @@
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import condition
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from datetime import datetime, timezone as dt_timezone
 from decimal import Decimal
+from django.utils import timezone
 from rest_framework import status
-from .serializers import CurrencyConvertSerializer
+from .serializers import (
+    CurrencyConvertSerializer, CurrencyBatchConvertSerializer, QuoteSerializer, RateHistorySerializer
+)
 
-from .models import Currency
+from . import engine, quotes
+from .caching import versioned_etag, versioned_json_response, versioned_last_modified
+from .history import rate_at
+from .models import Currency, RateSnapshot
+from .rates import rate_table
 from .serializers import CurrencySerializer
 
 
 
 @api_view(["GET"])
+@condition(
+    etag_func=lambda request: versioned_etag("currency_list", request),
+    last_modified_func=versioned_last_modified
+)
 def currency_list(request):
-    currencies = Currency.objects.filter(is_active=True)
-    serializer = CurrencySerializer(
-        currencies,
-        many=True,
-        context={"request": request}
-    )
-    return Response(serializer.data)
+    def build():
+        currencies = Currency.objects.filter(is_active=True)
+        serializer = CurrencySerializer(
+            currencies,
+            many=True,
+            context={"request": request}
+        )
+        return serializer.data
+
+    return versioned_json_response("currency_list", request, build)
+
+
+@api_view(["GET"])
+def rate_matrix(request):
+    """Full cross-rate matrix, answered with 304 when the ETag still matches."""
+    # one snapshot for the ETag and the body, so a refresh between the
+    # two can't pair the old ETag with the new matrix
+    matrix = rate_table.matrix()
+    response = get_conditional_response(request, etag=matrix.etag)
+    if response is None:
+        response = HttpResponse(matrix.body, content_type="application/json")
+    response["ETag"] = matrix.etag
+    return response
 
 
 @api_view(["POST"])
@@ -33,21 +64,124 @@ def convert_currency(request):
     amount = serializer.validated_data["amount"]
 
     try:
-        from_currency = Currency.objects.get(code=from_code, is_active=True)
-        to_currency = Currency.objects.get(code=to_code, is_active=True)
+        from_rate = rate_table.get_scaled(from_code)
+        to_rate = rate_table.get_scaled(to_code)
     except Currency.DoesNotExist:
         return Response(
             {"error": "Invalid currency code"},
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # conversion logic
-    amount_in_base = amount / from_currency.rate_to_base
-    converted_amount = amount_in_base * to_currency.rate_to_base
-
     return Response({
         "from_currency": from_code,
         "to_currency": to_code,
         "original_amount": amount,
-        "converted_amount": round(converted_amount, 2)
-    })
\ No newline at end of file
+        "converted_amount": engine.convert(amount, from_rate, to_rate)
+    })
+
+
+@api_view(["POST"])
+def create_quote(request):
+    """Lock the current rates for a conversion, executable once via send_money's quote_id."""
+    serializer = QuoteSerializer(data=request.data)
+
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        quote = quotes.issue(
+            request.user,
+            serializer.validated_data["from_currency"].upper(),
+            serializer.validated_data["to_currency"].upper(),
+            serializer.validated_data["amount"]
+        )
+    except Currency.DoesNotExist:
+        return Response(
+            {"error": "Invalid currency code"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response({
+        "quote_id": quote.id,
+        "from_currency": quote.from_currency,
+        "to_currency": quote.to_currency,
+        "original_amount": quote.amount,
+        "converted_amount": quote.converted,
+        "rate": (Decimal(quote.to_rate) / Decimal(quote.from_rate)).quantize(Decimal("0.000001")),
+        "expires_at": datetime.fromtimestamp(quote.expires_at, tz=dt_timezone.utc),
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(["POST"])
+def convert_currency_batch(request):
+    serializer = CurrencyBatchConvertSerializer(data=request.data)
+
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    conversions = serializer.validated_data["conversions"]
+
+    # one snapshot of the rate table for the whole batch
+    rates = rate_table.scaled_rates()
+
+    invalid = sorted({
+        code
+        for from_code, to_code, _ in conversions
+        for code in (from_code, to_code)
+        if code not in rates
+    })
+    if invalid:
+        return Response(
+            {"error": "Invalid currency code", "invalid_codes": invalid},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    results = [
+        {
+            "from_currency": from_code,
+            "to_currency": to_code,
+            "original_amount": amount,
+            "converted_amount": engine.convert(amount, rates[from_code], rates[to_code])
+        }
+        for from_code, to_code, amount in conversions
+    ]
+
+    return Response({"results": results})
+
+
+@api_view(["GET"])
+def rate_history(request):
+    """Rate between two currencies as of `at` (defaults to now)."""
+    serializer = RateHistorySerializer(data=request.GET)
+
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    from_code = data["from_currency"].upper()
+    to_code = data["to_currency"].upper()
+    at = data.get("at") or timezone.now()
+
+    try:
+        from_rate = rate_at(from_code, at)
+        to_rate = rate_at(to_code, at)
+    except RateSnapshot.DoesNotExist:
+        return Response(
+            {"error": "No rate history for that currency and time"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    response = {
+        "from_currency": from_code,
+        "to_currency": to_code,
+        "at": at,
+        "rate": round(to_rate / from_rate, 6),
+    }
+    if "amount" in data:
+        response["original_amount"] = data["amount"]
+        response["converted_amount"] = engine.convert(
+            data["amount"], engine.scale_rate(from_rate), engine.scale_rate(to_rate)
+        )
+
+    return Response(response)
+
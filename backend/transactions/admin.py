@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Transaction
+from .models import ExportJob, Transaction, TransferJob
 
 
 @admin.register(Transaction)
@@ -13,3 +13,15 @@ class TransactionAdmin(admin.ModelAdmin):
         "to_currency",
         "created_at"
     )
+
+
+@admin.register(TransferJob)
+class TransferJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "sender", "receiver", "amount_sent", "status", "created_at", "finished_at")
+    list_filter = ("status",)
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "output", "status", "row_count", "size", "created_at", "finished_at")
+    list_filter = ("status",)
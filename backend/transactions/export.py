@@ -0,0 +1,126 @@
+"""
+Transaction exports as CSV or NDJSON.
+
+rows() reads a user's history the same way transaction history does,
+one index walk per wallet and direction merged under a single UNION ALL
+statement, but read with iterator() and without a LIMIT: the database
+merges the walks as it goes, so nothing is sorted or held in memory and
+the first rows go out within milliseconds for any history size.
+render() turns rows into text a batch at a time, for a streaming
+response or a file.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.utils import timezone
+
+from wallet.models import Wallet
+from .models import Transaction
+from .pagination import merge_streams, merged
+from .serializers import _encode_datetime
+
+CHUNK_SIZE = 2000
+BATCH_SIZE = 500
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+CSV_HEADER = ["Date", "Type", "Amount Sent", "Currency Sent", "Amount Received", "Currency Received", "From/To"]
+
+EXPORT_VALUES = (
+    "id",
+    "sender_id",
+    "sender_email",
+    "receiver_email",
+    "amount_sent",
+    "amount_received",
+    "from_currency",
+    "to_currency",
+    "created_at",
+)
+
+
+def _midnight(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.get_current_timezone())
+
+
+def rows(user, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """
+    The user's transactions newest first, between the dates `start` and
+    `end` (inclusive, either may be None), with "sent" set on each row.
+    """
+    wallet_ids = list(Wallet.objects.filter(user=user).values_list("id", flat=True))
+
+    transactions = Transaction.objects.values(*EXPORT_VALUES)
+    if start is not None:
+        transactions = transactions.filter(created_at__gte=_midnight(start))
+    if end is not None:
+        transactions = transactions.filter(created_at__lt=_midnight(end + timedelta(days=1)))
+
+    streams = [transactions.filter(sender_id=wallet_id) for wallet_id in wallet_ids]
+    streams += [transactions.filter(receiver_id=wallet_id) for wallet_id in wallet_ids]
+    own = set(wallet_ids)
+    for row in merge_streams(query.iterator(chunk_size) for query in merged(streams)):
+        row["sent"] = row["sender_id"] in own
+        yield row
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+
+    for batch in _batches(rows, BATCH_SIZE):
+        for row in batch:
+            sent = row["sent"]
+            writer.writerow([
+                row["created_at"].strftime("%Y-%m-%d %H:%M:%S"),
+                "Sent" if sent else "Received",
+                row["amount_sent"] if sent else "",
+                row["from_currency"] if sent else "",
+                row["amount_received"] if not sent else "",
+                row["to_currency"] if not sent else "",
+                row["receiver_email"] if sent else row["sender_email"],
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        # header of an empty export
+        yield buffer.getvalue()
+
+
+def _ndjson(rows):
+    # the same objects /api/transactions/ returns, one per line
+    for batch in _batches(rows, BATCH_SIZE):
+        yield "".join(
+            json.dumps({
+                "id": row["id"],
+                "sender_email": row["sender_email"],
+                "receiver_email": row["receiver_email"],
+                "amount_sent": f"{row['amount_sent']:.2f}",
+                "amount_received": f"{row['amount_received']:.2f}",
+                "from_currency": row["from_currency"],
+                "to_currency": row["to_currency"],
+                "created_at": _encode_datetime(row["created_at"]),
+                "type": "sent" if row["sent"] else "received",
+            }, separators=(",", ":")) + "\n"
+            for row in batch
+        )
+
+
+def render(rows, output):
+    """Text chunks of rows in one of FORMATS."""
+    return _csv(rows) if output == "csv" else _ndjson(rows)
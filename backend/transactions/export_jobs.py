@@ -0,0 +1,115 @@
+"""
+Background transaction exports.
+
+create() queues an ExportJob and the process_exports worker claims jobs
+the same way async transfers are claimed. Each export is written a chunk
+at a time to a .part file under MEDIA_ROOT/exports and renamed into place
+once complete, so a download never sees a half-written file. File names
+are random because MEDIA_URL is served without authentication in DEBUG;
+clients download through /api/exports/<id>/download/.
+"""
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from . import export
+from .jobs import ClaimLost, claim_batch, finish
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = "exports"
+
+
+def create(user, output, start=None, end=None):
+    return ExportJob.objects.create(user=user, output=output, start_date=start, end_date=end)
+
+
+def claim(limit):
+    """Claim up to `limit` runnable exports, oldest first. Returns the claimed jobs."""
+    token = claim_batch(ExportJob, limit, settings.EXPORT_JOB_TIMEOUT)
+    if token is None:
+        return []
+
+    return list(
+        ExportJob.objects.filter(claim_token=token, status=ExportJob.PROCESSING)
+        .select_related("user").order_by("id")
+    )
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def run(job):
+    """Write one claimed export. Returns its final status."""
+    name = f"{EXPORT_DIR}/{uuid.uuid4().hex}.{job.output}"
+    path = default_storage.path(name)
+    partial = f"{path}.part"
+    row_count = 0
+
+    def counted(rows):
+        nonlocal row_count
+        for row in rows:
+            row_count += 1
+            yield row
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        rows = counted(export.rows(job.user, job.start_date, job.end_date))
+        with open(partial, "wb") as f:
+            for chunk in export.render(rows, job.output):
+                f.write(chunk.encode())
+        os.replace(partial, path)
+
+        finish(job, status=ExportJob.COMPLETED, file=name, size=os.path.getsize(path), row_count=row_count)
+        return ExportJob.COMPLETED
+    except ClaimLost:
+        logger.warning(f"Export job {job.pk} was reclaimed by another worker")
+        _remove(path)
+        return ExportJob.PROCESSING
+    except Exception:
+        logger.exception(f"Export job {job.pk} failed")
+        _remove(partial)
+        _remove(path)
+
+    try:
+        finish(job, status=ExportJob.FAILED, error="Export failed")
+    except ClaimLost:
+        return ExportJob.PROCESSING
+    return ExportJob.FAILED
+
+
+def purge(before, batch_size=1000):
+    """
+    Delete exports finished before `before`, with their files, and any
+    unreferenced file under the export directory last written before
+    then, like the .part file of a crashed worker. Returns the number of
+    jobs deleted.
+    """
+    expired = ExportJob.objects.filter(finished_at__lt=before)
+
+    deleted = 0
+    while True:
+        batch = list(expired.values_list("id", "file")[:batch_size])
+        if not batch:
+            break
+        for _, name in batch:
+            if name:
+                default_storage.delete(name)
+        deleted += ExportJob.objects.filter(id__in=[pk for pk, _ in batch]).delete()[0]
+
+    if default_storage.exists(EXPORT_DIR):
+        referenced = set(ExportJob.objects.exclude(file="").values_list("file", flat=True))
+        for filename in default_storage.listdir(EXPORT_DIR)[1]:
+            name = f"{EXPORT_DIR}/{filename}"
+            if name not in referenced and default_storage.get_modified_time(name) < before:
+                default_storage.delete(name)
+
+    return deleted
@@ -0,0 +1,155 @@
+"""
+Idempotency-Key support for money-moving endpoints.
+
+The first request with a key claims a row and stores its response once
+it finishes. Retries with the same key get the stored response back
+without running the view again; a retry that arrives while the first
+request is still running waits for it to finish.
+
+The view runs in one atomic() block with the write of its response, so
+a transfer and the record of it commit together: a claim that never got
+a response moved no money. Such a claim only holds the key for a short
+lease, after which a retry may take it over; the full TTL starts once a
+response is stored. The request holding a claim locks its row before
+running the view, so a takeover waits for it to commit or roll back and
+then finds the response, and a request whose claim was already taken
+over does not run at all.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+POLL_SECONDS = 0.1
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path} {body}".encode()).hexdigest()
+
+
+def _claim(user, key, request_hash):
+    """
+    Return (record, created); an expired record, or an unfinished one
+    whose lease ran out, is replaced.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+
+    for _ in range(2):
+        try:
+            with db_transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user,
+                    key=key,
+                    request_hash=request_hash,
+                    expires_at=now + lease
+                )
+            return record, True
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is not None and record.expires_at > now:
+            return record, False
+
+        # expired, abandoned mid-flight, or released by a failed request
+        IdempotencyKey.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+
+    raise IntegrityError(f"Could not claim idempotency key {key}")
+
+
+def _wait_for_completion(record):
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while record.status_code is None:
+        if time.monotonic() > deadline:
+            return None
+        time.sleep(POLL_SECONDS)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            # the first request failed and released the key
+            return None
+    return record
+
+
+def idempotent(view):
+    """Make a DRF function view replay its response for a repeated Idempotency-Key."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response(
+                {"error": f"{HEADER} must be at most 255 characters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        request_hash = _fingerprint(request)
+        record, created = _claim(request.user, key, request_hash)
+
+        if not created:
+            if record.request_hash != request_hash:
+                return Response(
+                    {"error": f"{HEADER} was already used for a different request"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+
+            record = _wait_for_completion(record)
+            if record is None:
+                return Response(
+                    {"error": f"A request with this {HEADER} is still in progress"},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            response = Response(record.response_body, status=record.status_code)
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            with db_transaction.atomic():
+                # locks the claim until the response is stored; nothing to
+                # update means a retry took the key over after the lease ran out
+                held = IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).update(
+                    expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+                )
+                if not held:
+                    return Response(
+                        {"error": f"A request with this {HEADER} is still in progress"},
+                        status=status.HTTP_409_CONFLICT
+                    )
+
+                response = view(request, *args, **kwargs)
+
+                if response.status_code >= 500:
+                    # server errors are not final, undo them and let the client retry for real
+                    db_transaction.set_rollback(True)
+                else:
+                    # store exactly what the client received, as plain JSON
+                    IdempotencyKey.objects.filter(pk=record.pk).update(
+                        status_code=response.status_code,
+                        response_body=json.loads(JSONRenderer().render(response.data)),
+                        expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+                    )
+                    return response
+        except Exception:
+            # rolled back with everything the view wrote
+            record.delete()
+            raise
+
+        record.delete()
+        return response
+
+    return wrapper
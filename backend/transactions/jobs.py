@@ -0,0 +1,124 @@
+"""
+Database-backed queue behind async send_money.
+
+Workers claim pending jobs in batches: candidate rows are read with
+SELECT ... FOR UPDATE SKIP LOCKED where the database supports it, then
+flipped to processing with a conditional UPDATE that stamps a claim
+token, so two workers never run the same job even on SQLite. A job is
+finished in the same database transaction as its transfer, and only by
+the worker holding its claim token, which makes reclaiming jobs from a
+dead worker safe. A job priced with a quote carries it, and a failed job
+puts the quote back like a failed synchronous send does.
+"""
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from currency import quotes
+
+from .models import TransferJob
+from .services import InsufficientBalance, transfer
+
+logger = logging.getLogger(__name__)
+
+
+class ClaimLost(Exception):
+    """The job was reclaimed by another worker while this one ran it."""
+
+
+def enqueue(sender_wallet, receiver_wallet, amount, converted_amount, quote=None):
+    return TransferJob.objects.create(
+        sender=sender_wallet,
+        receiver=receiver_wallet,
+        amount_sent=amount,
+        amount_received=converted_amount,
+        quote=quotes.dump(quote) if quote else None
+    )
+
+
+def claim_batch(model, limit, timeout):
+    """
+    Claim up to `limit` runnable rows of a job model, oldest first.
+    Returns the claim token stamped on them, or None if nothing was runnable.
+    """
+    now = timezone.now()
+    runnable = Q(status=model.PENDING) | Q(
+        status=model.PROCESSING,
+        claimed_at__lt=now - timedelta(seconds=timeout)
+    )
+    token = uuid.uuid4()
+
+    with db_transaction.atomic():
+        ids = list(
+            model.objects.select_for_update(skip_locked=True)
+            .filter(runnable).order_by("id").values_list("id", flat=True)[:limit]
+        )
+        if not ids:
+            return None
+        # re-checking runnable keeps this safe where SKIP LOCKED isn't available
+        model.objects.filter(runnable, id__in=ids).update(
+            status=model.PROCESSING,
+            claim_token=token,
+            claimed_at=now
+        )
+    return token
+
+
+def claim(limit):
+    """Claim up to `limit` runnable jobs, oldest first. Returns the claimed jobs."""
+    token = claim_batch(TransferJob, limit, settings.TRANSFER_JOB_TIMEOUT)
+    if token is None:
+        return []
+
+    return list(
+        TransferJob.objects.filter(claim_token=token, status=TransferJob.PROCESSING)
+        .select_related("sender__user", "receiver__user").order_by("id")
+    )
+
+
+def finish(job, **fields):
+    """Record a claimed job's outcome. Raises ClaimLost if another worker has it now."""
+    model = type(job)
+    finished = model.objects.filter(
+        pk=job.pk, claim_token=job.claim_token, status=model.PROCESSING
+    ).update(finished_at=timezone.now(), **fields)
+    if not finished:
+        raise ClaimLost(job.pk)
+
+
+def run(job):
+    """Execute one claimed job. Returns its final status."""
+    try:
+        with db_transaction.atomic():
+            transaction = transfer(job.sender, job.receiver, job.amount_sent, job.amount_received)
+            finish(job, status=TransferJob.COMPLETED, transaction=transaction)
+        return TransferJob.COMPLETED
+    except ClaimLost:
+        logger.warning(f"Transfer job {job.pk} was reclaimed by another worker")
+        return TransferJob.PROCESSING
+    except InsufficientBalance:
+        error = "Insufficient balance"
+    except OperationalError:
+        # lock timeouts and deadlock victims are worth another try
+        logger.warning(f"Transfer job {job.pk} hit a database error, requeueing", exc_info=True)
+        TransferJob.objects.filter(pk=job.pk, claim_token=job.claim_token).update(
+            status=TransferJob.PENDING, claim_token=None, claimed_at=None
+        )
+        return TransferJob.PENDING
+    except Exception:
+        logger.exception(f"Transfer job {job.pk} failed")
+        error = "Transfer failed"
+
+    try:
+        finish(job, status=TransferJob.FAILED, error=error)
+    except ClaimLost:
+        return TransferJob.PROCESSING
+    if job.quote:
+        # the sender can retry at the rate they were quoted
+        quotes.release(quotes.load(job.quote))
+    return TransferJob.FAILED
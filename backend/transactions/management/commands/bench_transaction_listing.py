@@ -0,0 +1,91 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import User
+from transactions.models import Transaction
+from transactions.serializers import TransactionSerializer, encode_transactions, listing_rows
+from wallet.models import BalanceSnapshot, LedgerEntry, Wallet
+
+EMAIL_TEMPLATE = 'bench-listing-{}@bench.invalid'
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec of TransactionSerializer against the values() listing encoder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, action='append', help='Listing sizes, default 10000 and 100000')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--skip-lazy', action='store_true', help='Skip the N+1 baseline, slow at 100k rows')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark users afterwards')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['rows'] or [10000, 100000])
+        users = self.seed(options['users'], sizes[-1])
+        user = users[0]
+        wallets = list(Wallet.objects.filter(user=user))
+
+        request = RequestFactory().get('/api/transactions/')
+        request.user = user
+        renderer = JSONRenderer()
+        base = Transaction.objects.filter(sender__user__in=users).order_by('id')
+
+        variants = [
+            ('ModelSerializer, lazy relations', lambda qs: TransactionSerializer(
+                qs, many=True, context={'request': request}).data),
+            ('ModelSerializer, select_related', lambda qs: TransactionSerializer(
+                qs.select_related('sender__user', 'receiver__user'), many=True, context={'request': request}).data),
+            ('values() + encoder', lambda qs: encode_transactions(listing_rows(qs), [wallets[0].pk])),
+        ]
+        if options['skip_lazy']:
+            variants = variants[1:]
+
+        try:
+            for size in sizes:
+                for label, build in variants:
+                    started = time.perf_counter()
+                    body = renderer.render(build(base[:size]))
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'{size:>7} rows  {label:<32} {elapsed * 1000:9.1f} ms  '
+                        f'{size / elapsed:>10,.0f} rows/sec  ({len(body):,} bytes)'
+                    )
+        finally:
+            if not options['keep']:
+                # ledger rows protect their wallets, drop the benchmark's own first
+                LedgerEntry.objects.filter(wallet__user__in=users).delete()
+                BalanceSnapshot.objects.filter(wallet__user__in=users).delete()
+                User.objects.filter(pk__in=[u.pk for u in users]).delete()
+
+    def seed(self, user_count, rows):
+        users = []
+        for i in range(user_count):
+            user, _ = User.objects.get_or_create(email=EMAIL_TEMPLATE.format(i))
+            users.append(user)
+        wallets = []
+        for user in users:
+            wallet, _ = Wallet.objects.get_or_create(user=user, currency='USD')
+            wallets.append(wallet)
+
+        existing = Transaction.objects.filter(sender__in=wallets).count()
+        rng = random.Random(0)
+        batch = []
+        for _ in range(rows - existing):
+            sender, receiver = rng.sample(wallets, 2)
+            amount = Decimal(rng.randint(1, 100000)).scaleb(-2)
+            batch.append(Transaction(
+                sender=sender,
+                receiver=receiver,
+                amount_sent=amount,
+                amount_received=amount,
+                from_currency='USD',
+                to_currency='USD',
+                sender_email=sender.user.email,
+                receiver_email=receiver.user.email
+            ))
+        Transaction.objects.bulk_create(batch, batch_size=5000)
+        return users
@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from accounts.models import User
+from wallet import ledger
+from wallet.models import BalanceSnapshot, LedgerEntry, Wallet
+from transactions.services import InsufficientBalance, transfer
+
+EMAIL_TEMPLATE = 'bench-transfer-{}@bench.invalid'
+
+
+class Command(BaseCommand):
+    help = 'Stress concurrent transfers and check that balances are conserved'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallets', type=int, default=20)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--transfers', type=int, default=2000, help='Transfers per thread')
+        parser.add_argument('--balance', type=Decimal, default=Decimal('100.00'))
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark users afterwards')
+
+    def handle(self, *args, **options):
+        wallets = self.setup_wallets(options['wallets'], options['balance'])
+        ids = [w.pk for w in wallets]
+        before = self.total(ids)
+
+        counts = {'ok': 0, 'insufficient': 0, 'errors': 0}
+        counts_lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local = dict.fromkeys(counts, 0)
+            try:
+                for _ in range(options['transfers']):
+                    sender, receiver = rng.sample(wallets, 2)
+                    amount = Decimal(rng.randint(1, 2000)).scaleb(-2)
+                    try:
+                        transfer(sender, receiver, amount, amount)
+                        local['ok'] += 1
+                    except InsufficientBalance:
+                        local['insufficient'] += 1
+                    except OperationalError:
+                        local['errors'] += 1
+            finally:
+                connection.close()
+                with counts_lock:
+                    for key, value in local.items():
+                        counts[key] += value
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        after = self.total(ids)
+        overdrawn = Wallet.objects.filter(pk__in=ids, balance__lt=0).count()
+
+        attempted = sum(counts.values())
+        self.stdout.write(
+            f"{options['threads']} threads, {attempted} transfers in {elapsed:.2f}s: "
+            f"{counts['ok'] / elapsed:,.0f} committed transfers/sec"
+        )
+        self.stdout.write(
+            f"committed {counts['ok']}, insufficient balance {counts['insufficient']}, "
+            f"database errors {counts['errors']}"
+        )
+
+        if before == after and not overdrawn:
+            self.stdout.write(self.style.SUCCESS(f'Balances conserved: {before} before and after'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'Balance mismatch: {before} before, {after} after, {overdrawn} overdrawn wallets'
+            ))
+
+        if not options['keep']:
+            # ledger rows protect their wallets, drop the benchmark's own first
+            user_ids = [w.user_id for w in wallets]
+            LedgerEntry.objects.filter(wallet__user__in=user_ids).delete()
+            BalanceSnapshot.objects.filter(wallet__user__in=user_ids).delete()
+            User.objects.filter(pk__in=user_ids).delete()
+
+    def setup_wallets(self, count, balance):
+        wallets = []
+        for i in range(count):
+            user, _ = User.objects.get_or_create(email=EMAIL_TEMPLATE.format(i))
+            wallet, _ = Wallet.objects.get_or_create(user=user, currency='USD')
+            difference = balance - Decimal(wallet.balance)
+            if difference:
+                # balances only move through the ledger
+                ledger.post([LedgerEntry(
+                    wallet_id=wallet.pk,
+                    amount=difference,
+                    kind=LedgerEntry.OPENING
+                )])
+            wallets.append(wallet)
+        return wallets
+
+    def total(self, ids):
+        return Wallet.objects.filter(pk__in=ids).aggregate(total=Sum('balance'))['total']
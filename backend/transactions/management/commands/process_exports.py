@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from transactions import export_jobs
+
+
+class Command(BaseCommand):
+    help = 'Write queued transaction exports to files under MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1, help='Exports claimed per round trip')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+        parser.add_argument('--idle-interval', type=float, default=5, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                claimed = export_jobs.claim(options['batch_size'])
+                if not claimed:
+                    if options['once']:
+                        break
+                    time.sleep(options['idle_interval'])
+                    continue
+
+                # claimed jobs still waiting here when EXPORT_JOB_TIMEOUT runs out
+                # go to another worker, so keep batches small
+                for job in claimed:
+                    started = time.monotonic()
+                    status = export_jobs.run(job)
+                    elapsed_ms = (time.monotonic() - started) * 1000
+                    job.refresh_from_db(fields=['row_count', 'size'])
+                    self.stdout.write(
+                        f'Export {job.pk} {status} in {elapsed_ms:.1f} ms: '
+                        f'{job.row_count} rows, {job.size} bytes'
+                    )
+        except KeyboardInterrupt:
+            pass
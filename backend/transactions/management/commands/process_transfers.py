@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from transactions import jobs
+from transactions.models import TransferJob
+
+
+class Command(BaseCommand):
+    help = 'Run queued async transfers with a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Transfers run in parallel')
+        parser.add_argument('--batch-size', type=int, default=50, help='Jobs claimed per round trip')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+        parser.add_argument('--idle-interval', type=float, default=1, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            try:
+                while True:
+                    close_old_connections()
+                    claimed = jobs.claim(options['batch_size'])
+                    if not claimed:
+                        if options['once']:
+                            break
+                        time.sleep(options['idle_interval'])
+                        continue
+
+                    started = time.monotonic()
+                    statuses = list(pool.map(self.run, claimed))
+                    elapsed_ms = (time.monotonic() - started) * 1000
+                    self.stdout.write(
+                        f'Ran {len(claimed)} transfers in {elapsed_ms:.1f} ms: '
+                        f'{statuses.count(TransferJob.COMPLETED)} completed, '
+                        f'{statuses.count(TransferJob.FAILED)} failed, '
+                        f'{statuses.count(TransferJob.PENDING)} requeued'
+                    )
+            except KeyboardInterrupt:
+                pass
+
+    def run(self, job):
+        try:
+            return jobs.run(job)
+        finally:
+            # pool threads outlive the batch, don't let them hold stale connections
+            close_old_connections()
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transactions.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+
+        deleted = 0
+        while True:
+            # delete in slices so one run never holds a long lock on the table
+            ids = list(expired.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transactions.export_jobs import purge
+
+
+class Command(BaseCommand):
+    help = 'Delete finished exports and their files once they are older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.EXPORT_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge(timezone.now() - timedelta(days=options['days']), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} exports'))
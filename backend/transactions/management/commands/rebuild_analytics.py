@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user analytics totals from the transaction table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only rebuild this user id')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild(set(options['users']) if options['users'] else None)
+        elapsed_ms = (time.monotonic() - started) * 1000
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} analytics rows in {elapsed_ms:.1f} ms'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0002_idempotencykey'),
+        ('wallet', '0004_wallet_shard_count_walletshard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransferJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount_sent', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('amount_received', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('claim_token', models.UUIDField(blank=True, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='received_transfer_jobs', to='wallet.wallet')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sent_transfer_jobs', to='wallet.wallet')),
+                ('transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='job', to='transactions.transaction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='transfer_job_queue_idx')],
+            },
+        ),
+    ]
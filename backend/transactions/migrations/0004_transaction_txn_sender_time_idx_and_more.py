@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0003_transferjob'),
+        ('wallet', '0004_wallet_shard_count_walletshard'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['sender', 'created_at', 'id'], name='txn_sender_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['receiver', 'created_at', 'id'], name='txn_receiver_time_idx'),
+        ),
+    ]
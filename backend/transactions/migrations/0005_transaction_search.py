@@ -0,0 +1,92 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+SEARCH_COLUMNS = ('sender_email', 'receiver_email', 'from_currency', 'to_currency')
+
+SQLITE_SEARCH_INDEX = [
+    # external content table: FTS5 keeps only the trigram index, the rows
+    # stay in transactions_transaction and triggers keep the two in step
+    f"""CREATE VIRTUAL TABLE transactions_search USING fts5(
+        {', '.join(SEARCH_COLUMNS)},
+        content='transactions_transaction', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER transactions_search_ai AFTER INSERT ON transactions_transaction BEGIN
+        INSERT INTO transactions_search(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER transactions_search_ad AFTER DELETE ON transactions_transaction BEGIN
+        INSERT INTO transactions_search(transactions_search, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER transactions_search_au AFTER UPDATE ON transactions_transaction BEGIN
+        INSERT INTO transactions_search(transactions_search, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in SEARCH_COLUMNS)});
+        INSERT INTO transactions_search(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in SEARCH_COLUMNS)});
+    END""",
+    "INSERT INTO transactions_search(transactions_search) VALUES ('rebuild')",
+]
+
+SQLITE_DROP_SEARCH_INDEX = [
+    "DROP TRIGGER IF EXISTS transactions_search_ai",
+    "DROP TRIGGER IF EXISTS transactions_search_ad",
+    "DROP TRIGGER IF EXISTS transactions_search_au",
+    "DROP TABLE IF EXISTS transactions_search",
+]
+
+# Django's icontains is UPPER(col::text) LIKE UPPER(%s) on Postgres,
+# so the trigram indexes are built on that same expression
+POSTGRES_SEARCH_INDEX = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+    f'CREATE INDEX txn_{column}_trgm_idx ON transactions_transaction '
+    f'USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+    for column in SEARCH_COLUMNS
+]
+
+POSTGRES_DROP_SEARCH_INDEX = [
+    f'DROP INDEX IF EXISTS txn_{column}_trgm_idx' for column in SEARCH_COLUMNS
+]
+
+
+def backfill_emails(apps, schema_editor):
+    Transaction = apps.get_model('transactions', 'Transaction')
+    Wallet = apps.get_model('wallet', 'Wallet')
+
+    def email_of(field):
+        return Subquery(Wallet.objects.filter(pk=OuterRef(field)).values('user__email')[:1])
+
+    Transaction.objects.update(
+        sender_email=email_of('sender_id'),
+        receiver_email=email_of('receiver_id')
+    )
+
+
+def run_statements(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_transaction_txn_sender_time_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='receiver_email',
+            field=models.EmailField(blank=True, default='', max_length=254),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='sender_email',
+            field=models.EmailField(blank=True, default='', max_length=254),
+        ),
+        migrations.RunPython(backfill_emails, migrations.RunPython.noop),
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_SEARCH_INDEX, 'postgresql': POSTGRES_SEARCH_INDEX}),
+            run_statements({'sqlite': SQLITE_DROP_SEARCH_INDEX, 'postgresql': POSTGRES_DROP_SEARCH_INDEX}),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0005_transaction_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=10)),
+                ('total_sent', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('total_received', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('received_count', models.PositiveIntegerField(default=0)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'currency')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0006_transactionstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('output', models.CharField(choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')], default='csv', max_length=10)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('file', models.FileField(blank=True, upload_to='exports/')),
+                ('size', models.BigIntegerField(default=0)),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('claim_token', models.UUIDField(blank=True, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='export_job_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0007_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transferjob',
+            name='quote',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
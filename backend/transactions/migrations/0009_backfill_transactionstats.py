@@ -0,0 +1,29 @@
+from django.db import migrations
+
+from transactions.stats import totals
+
+
+def backfill(apps, schema_editor):
+    Transaction = apps.get_model("transactions", "Transaction")
+    TransactionStats = apps.get_model("transactions", "TransactionStats")
+
+    # stats recorded since 0006 only cover the transfers made after it
+    TransactionStats.objects.all().delete()
+    TransactionStats.objects.bulk_create(
+        [
+            TransactionStats(user_id=user_id, currency=currency, **delta)
+            for (user_id, currency), delta in totals(Transaction.objects.all()).items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("transactions", "0008_transferjob_quote"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -18,7 +18,176 @@ class Transaction(models.Model):
     amount_received = models.DecimalField(max_digits=12, decimal_places=2)
     from_currency = models.CharField(max_length=10)
     to_currency = models.CharField(max_length=10)
+    # copies of the parties' emails so search needs no joins, see search.py
+    sender_email = models.EmailField(blank=True, default="")
+    receiver_email = models.EmailField(blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # keyset pagination walks these from the cursor, see pagination.py
+        indexes = [
+            models.Index(fields=["sender", "created_at", "id"], name="txn_sender_time_idx"),
+            models.Index(fields=["receiver", "created_at", "id"], name="txn_receiver_time_idx"),
+        ]
+
     def __str__(self):
         return f"{self.sender.user.email} → {self.receiver.user.email}"
+
+
+class TransactionStats(models.Model):
+    """
+    Running totals of one user's transfers in one currency, kept up to
+    date by transactions.stats in the same database transaction as each
+    transfer. Sent amounts count against the sender's currency, received
+    amounts against the receiver's.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="transaction_stats"
+    )
+    currency = models.CharField(max_length=10)
+    total_sent = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    total_received = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    received_count = models.PositiveIntegerField(default=0)
+    # transfers between two of the user's own wallets are counted once
+    transaction_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("user", "currency")
+
+    def __str__(self):
+        return f"{self.user_id} {self.currency}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a money-moving request sent with an
+    Idempotency-Key header, replayed for retries until it expires.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys"
+    )
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # null until the first request finishes
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # a short lease while the request runs, the replay TTL once it finished
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ("user", "key")
+
+    def __str__(self):
+        return f"{self.user_id}:{self.key}"
+
+
+class TransferJob(models.Model):
+    """
+    A send_money request accepted in async mode, executed later by the
+    process_transfers worker. Amounts are converted when the job is
+    queued, so the receiver gets the rate the sender was shown.
+    """
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (PROCESSING, "Processing"),
+        (COMPLETED, "Completed"),
+        (FAILED, "Failed"),
+    )
+
+    sender = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        related_name="sent_transfer_jobs"
+    )
+    receiver = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        related_name="received_transfer_jobs"
+    )
+    amount_sent = models.DecimalField(max_digits=12, decimal_places=2)
+    amount_received = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    error = models.CharField(max_length=255, blank=True)
+    transaction = models.OneToOneField(
+        Transaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="job"
+    )
+    # the consumed quote the job was priced with, released if the job fails
+    quote = models.JSONField(null=True, blank=True)
+    # set by the worker that claimed the job, so only it may finish it
+    claim_token = models.UUIDField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="transfer_job_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"Transfer job {self.pk} ({self.status})"
+
+
+class ExportJob(models.Model):
+    """
+    A transaction export written to a file under MEDIA_ROOT by the
+    process_exports worker, for downloads too big to stream per request.
+    """
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (PROCESSING, "Processing"),
+        (COMPLETED, "Completed"),
+        (FAILED, "Failed"),
+    )
+
+    OUTPUT_CHOICES = (
+        ("csv", "CSV"),
+        ("ndjson", "NDJSON"),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="export_jobs"
+    )
+    output = models.CharField(max_length=10, choices=OUTPUT_CHOICES, default="csv")
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    error = models.CharField(max_length=255, blank=True)
+    file = models.FileField(upload_to="exports/", blank=True)
+    size = models.BigIntegerField(default=0)
+    row_count = models.PositiveIntegerField(default=0)
+    # set by the worker that claimed the job, so only it may finish it
+    claim_token = models.UUIDField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="export_job_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"Export job {self.pk} ({self.status})"
@@ -0,0 +1,112 @@
+"""
+Keyset pagination for transaction history.
+
+Pages are ordered by (created_at, id) descending and the cursor is the
+key of the last row of the previous page, so fetching page N costs the
+same as fetching page 1. A user's history is the union of several
+(wallet, direction) streams, each one range of the
+(sender|receiver, created_at, id) index. They are combined with UNION
+ALL under a single ORDER BY, which SQLite and Postgres both execute as
+a merge of index walks that stops at the LIMIT, so a page is one
+statement however many wallets the user holds. One IN/OR query over all
+wallets would have to sort every matching row before applying LIMIT.
+"""
+import base64
+import heapq
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+MAX_PAGE_SIZE = 500
+# SQLite allows at most 500 terms in a compound SELECT
+MAX_UNION = 250
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row):
+    key = f"{row['created_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Returns (created_at, id). Raises InvalidCursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def page_request(request):
+    """
+    (size, cursor) from the page_size, or limit for older clients, and
+    cursor query parameters. Raises InvalidCursor for a bad cursor and
+    ValueError for a bad page_size.
+    """
+    size = int(request.GET.get("page_size") or request.GET.get("limit") or settings.TRANSACTION_PAGE_SIZE)
+    cursor = request.GET.get("cursor")
+    return min(max(size, 1), MAX_PAGE_SIZE), decode_cursor(cursor) if cursor else None
+
+
+def link_next(request, response, page, has_more):
+    """Point the response at the page after `page` if there is one."""
+    if has_more:
+        next_cursor = encode_cursor(page[-1])
+        query = request.GET.copy()
+        query["cursor"] = next_cursor
+        response["X-Next-Cursor"] = next_cursor
+        response["Link"] = f'<{request.build_absolute_uri(request.path)}?{query.urlencode()}>; rel="next"'
+    return response
+
+
+def _sort_key(row):
+    return (row["created_at"], row["id"])
+
+
+def merged(streams):
+    """
+    values() querysets of transaction rows combined into one newest-first
+    query per MAX_UNION streams. Rows found in several streams, like a
+    transfer between a user's own wallets, are repeated.
+    """
+    return [
+        streams[start].union(*streams[start + 1:start + MAX_UNION], all=True).order_by("-created_at", "-id")
+        for start in range(0, len(streams), MAX_UNION)
+    ]
+
+
+def keyset_page(streams, size, cursor=None):
+    """
+    Merge values() querysets of transaction rows into one page of at most
+    `size` rows, newest first. Returns (page, has_more).
+    """
+    after = Q()
+    if cursor is not None:
+        created_at, pk = cursor
+        after = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+
+    # size + 1 rows tell whether anything is left after this page; a
+    # transaction is in at most two streams, so twice that many hold them
+    fetched = [list(query[:2 * (size + 1)]) for query in merged([stream.filter(after) for stream in streams])]
+
+    page = list(merge_streams(fetched))
+    return page[:size], len(page) > size
+
+
+def merge_streams(streams):
+    """
+    Lazily merge iterables of transaction rows that are each ordered
+    newest first. A transaction found in several streams, like a transfer
+    between a user's own wallets, is yielded once.
+    """
+    last_id = None
+    for row in heapq.merge(*streams, key=_sort_key, reverse=True):
+        # copies of a row share its sort key, so they come out together
+        if row["id"] != last_id:
+            last_id = row["id"]
+            yield row
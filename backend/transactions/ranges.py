@@ -0,0 +1,84 @@
+"""
+Single-range file downloads (RFC 9110 section 14), so a client whose
+connection dropped can resume with Range: bytes=<received>-. Multiple
+ranges and malformed headers are answered with the whole file, which the
+RFC allows.
+"""
+import re
+
+from django.http import HttpResponse, StreamingHttpResponse
+
+BLOCK_SIZE = 64 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class Unsatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    The (first, last) byte positions a Range header asks for, or None to
+    send the whole file. Raises Unsatisfiable.
+    """
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # bytes=-N is the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise Unsatisfiable(header)
+        return max(size - length, 0), size - 1
+
+    first = int(first)
+    if last and int(last) < first:
+        # bytes=5-2 is invalid rather than unsatisfiable
+        return None
+    if first >= size:
+        raise Unsatisfiable(header)
+    return first, min(int(last), size - 1) if last else size - 1
+
+
+def _read(path, first, length):
+    with open(path, "rb") as f:
+        f.seek(first)
+        while length > 0:
+            block = f.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def file_response(request, path, size, content_type, filename, etag):
+    """Stream the file at `path`, honouring Range and If-Range."""
+    requested = request.headers.get("Range")
+    # a resumed download only continues if the file is still the same one
+    if requested and request.headers.get("If-Range", etag) != etag:
+        requested = None
+
+    try:
+        byte_range = parse_range(requested, size) if requested else None
+    except Unsatisfiable:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    first, last = byte_range or (0, size - 1)
+    length = last - first + 1 if size else 0
+    response = StreamingHttpResponse(
+        _read(path, first, length),
+        content_type=content_type,
+        status=206 if byte_range else 200
+    )
+    if byte_range:
+        response["Content-Range"] = f"bytes {first}-{last}/{size}"
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,52 @@
+"""
+Transaction search.
+
+Search runs over the denormalized sender_email and receiver_email
+columns plus the currency codes, so it never joins wallets or users.
+On SQLite those columns are indexed by the FTS5 trigram table
+transactions_search (kept in step by triggers, see migration 0005); on
+Postgres by pg_trgm GIN indexes that serve icontains directly. Trigrams
+need three characters, shorter terms fall back to a scan of the
+transaction table alone.
+
+History is read as index walks per wallet that stop at the page size,
+so on SQLite the term is first looked up in transactions_search with a
+LIMIT. A rare term hands its few matching ids to every walk as a JSON
+array; a common one is checked row by row during the walks, which then
+stop after a page of hits instead of collecting every match, however
+many of the user's transactions contain it.
+"""
+import json
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TRIGRAM = 3
+# matches across all users up to which filtering on their ids beats walking
+MAX_MATCH_IDS = 1000
+
+
+def _fts_phrase(term):
+    # a quoted phrase is matched as a plain substring by the trigram tokenizer
+    return '"%s"' % term.replace('"', '""')
+
+
+def search(queryset, term):
+    """Filter a Transaction queryset to rows whose parties or currencies contain `term`."""
+    if connection.vendor == "sqlite" and len(term) >= TRIGRAM:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT rowid FROM transactions_search WHERE transactions_search MATCH %s LIMIT %s",
+                [_fts_phrase(term), MAX_MATCH_IDS + 1]
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        if len(ids) <= MAX_MATCH_IDS:
+            return queryset.filter(id__in=RawSQL("SELECT value FROM json_each(%s)", [json.dumps(ids)]))
+
+    return queryset.filter(
+        Q(sender_email__icontains=term) |
+        Q(receiver_email__icontains=term) |
+        Q(from_currency__icontains=term) |
+        Q(to_currency__icontains=term)
+    )
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Transaction
+from django.utils import timezone
+from .models import ExportJob, Transaction, TransferJob
 
 
 class SendMoneySerializer(serializers.Serializer):
@@ -7,6 +8,34 @@ class SendMoneySerializer(serializers.Serializer):
     from_currency = serializers.CharField()
     to_currency = serializers.CharField()
     amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    quote_id = serializers.CharField(required=False, max_length=64)
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be greater than zero")
+        return value
+
+class PayoutItemSerializer(serializers.Serializer):
+    receiver_email = serializers.EmailField()
+    to_currency = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be greater than zero")
+        return value
+
+class BulkSendMoneySerializer(serializers.Serializer):
+    MAX_ITEMS = 5000
+
+    from_currency = serializers.CharField()
+    all_or_nothing = serializers.BooleanField(default=False)
+    items = PayoutItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        if len(value) > self.MAX_ITEMS:
+            raise serializers.ValidationError(f"At most {self.MAX_ITEMS} payouts per request")
+        return value
 
 class TransactionSerializer(serializers.ModelSerializer):
     sender_email = serializers.CharField(source="sender.user.email", read_only=True)
@@ -29,6 +58,103 @@ class TransactionSerializer(serializers.ModelSerializer):
 
     def get_type(self, obj):
         request = self.context.get('request')
-        if request and request.user == obj.sender.user:
+        if request and request.user.pk == obj.sender.user_id:
             return "sent"
-        return "received"
\ No newline at end of file
+        return "received"
+
+# Listing rows are read with one values() query and encoded by hand: on
+# large pages the ModelSerializer machinery costs more than the query.
+# The emails come from the columns denormalized onto the transaction, so
+# the query joins nothing. The output is byte-for-byte what
+# TransactionSerializer renders.
+LISTING_VALUES = (
+    "id",
+    "sender_id",
+    "sender_email",
+    "receiver_email",
+    "amount_sent",
+    "amount_received",
+    "from_currency",
+    "to_currency",
+    "created_at",
+)
+
+
+def listing_rows(queryset):
+    return queryset.values(*LISTING_VALUES)
+
+
+def _encode_datetime(value):
+    # what DRF's DateTimeField renders with the default ISO 8601 format
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def encode_transactions(rows, wallet_ids):
+    """
+    TransactionSerializer(..., many=True).data for listing_rows(), as
+    seen by the user owning `wallet_ids`.
+    """
+    wallet_ids = set(wallet_ids)
+    return [
+        {
+            "id": row["id"],
+            "sender_email": row["sender_email"],
+            "receiver_email": row["receiver_email"],
+            "amount_sent": f"{row['amount_sent']:.2f}",
+            "amount_received": f"{row['amount_received']:.2f}",
+            "from_currency": row["from_currency"],
+            "to_currency": row["to_currency"],
+            "created_at": _encode_datetime(row["created_at"]),
+            "type": "sent" if row["sender_id"] in wallet_ids else "received",
+        }
+        for row in rows
+    ]
+
+class TransferJobSerializer(serializers.ModelSerializer):
+    receiver_email = serializers.CharField(source="receiver.user.email", read_only=True)
+    from_currency = serializers.CharField(source="sender.currency", read_only=True)
+    to_currency = serializers.CharField(source="receiver.currency", read_only=True)
+
+    class Meta:
+        model = TransferJob
+        fields = (
+            "id",
+            "status",
+            "receiver_email",
+            "amount_sent",
+            "amount_received",
+            "from_currency",
+            "to_currency",
+            "transaction",
+            "error",
+            "created_at",
+            "finished_at",
+        )
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = (
+            "id",
+            "status",
+            "output",
+            "start_date",
+            "end_date",
+            "row_count",
+            "size",
+            "error",
+            "download_url",
+            "created_at",
+            "finished_at",
+        )
+
+    def get_download_url(self, job):
+        if job.status != ExportJob.COMPLETED:
+            return None
+        return self.context["request"].build_absolute_uri(f"/api/exports/{job.pk}/download/")
@@ -0,0 +1,180 @@
+"""
+Money movement between wallets.
+
+Transfers are posted to the wallet ledger, which changes balances with
+conditional F() updates instead of read-modify-write on model
+instances, so concurrent transfers can't lose updates or overdraw a
+wallet. Rows are always updated in primary key order, which keeps two
+transfers going in opposite directions from deadlocking each other.
+"""
+from django.db import transaction as db_transaction
+
+from accounts.models import User
+from currency import engine
+from currency.rates import rate_table
+from wallet import ledger
+from wallet.ledger import InsufficientBalance  # noqa: F401
+from wallet.models import LedgerEntry, Wallet
+from . import stats
+from .models import Transaction
+
+
+def transfer(sender_wallet, receiver_wallet, amount, converted_amount):
+    """
+    Debit `amount` from the sender, credit `converted_amount` to the
+    receiver and record the Transaction, all or nothing. Raises
+    InsufficientBalance when the sender can't cover the amount. Load the
+    wallets with their users to save two queries.
+    """
+    with db_transaction.atomic():
+        transaction = Transaction.objects.create(
+            sender=sender_wallet,
+            receiver=receiver_wallet,
+            amount_sent=amount,
+            amount_received=converted_amount,
+            from_currency=sender_wallet.currency,
+            to_currency=receiver_wallet.currency,
+            sender_email=sender_wallet.user.email,
+            receiver_email=receiver_wallet.user.email
+        )
+        ledger.post([
+            LedgerEntry(
+                wallet_id=sender_wallet.pk,
+                amount=-amount,
+                kind=LedgerEntry.TRANSFER_OUT,
+                transaction=transaction
+            ),
+            LedgerEntry(
+                wallet_id=receiver_wallet.pk,
+                amount=converted_amount,
+                kind=LedgerEntry.TRANSFER_IN,
+                transaction=transaction
+            ),
+        ])
+        stats.record([transaction])
+        return transaction
+
+
+def _resolve_payouts(sender_wallet, items):
+    """Attach receiver wallets and converted amounts, or an error, to each item."""
+    emails = {item["receiver_email"] for item in items}
+    users = dict(User.objects.filter(email__in=emails).values_list("email", "id"))
+
+    currencies = {item["to_currency"].upper() for item in items}
+    wallets = {
+        (wallet.user_id, wallet.currency): wallet
+        for wallet in Wallet.objects.filter(user_id__in=users.values(), currency__in=currencies)
+    }
+
+    rates = rate_table.scaled_rates()
+    from_rate = rates.get(sender_wallet.currency)
+
+    rows = []
+    for index, item in enumerate(items):
+        to_code = item["to_currency"].upper()
+        row = {"index": index, "receiver_email": item["receiver_email"], "amount": item["amount"]}
+        receiver_wallet = wallets.get((users.get(item["receiver_email"]), to_code))
+
+        if receiver_wallet is None:
+            row["error"] = "Receiver wallet not found"
+        elif from_rate is None or to_code not in rates:
+            row["error"] = "Invalid currency code"
+        else:
+            row["wallet"] = receiver_wallet
+            row["converted"] = engine.convert(item["amount"], from_rate, rates[to_code])
+        rows.append(row)
+    return rows
+
+
+def bulk_transfer(sender_wallet, items, all_or_nothing=False):
+    """
+    Pay many receivers from one wallet in a single database transaction.
+
+    Receivers, wallets and rates are resolved with set-based queries, the
+    sender and receivers are locked once in primary key order, and
+    Transactions and ledger entries are written with bulk_create. Returns one result dict per item; with
+    all_or_nothing a single failing row fails the whole batch.
+    """
+    rows = _resolve_payouts(sender_wallet, items)
+
+    with db_transaction.atomic():
+        # the sender is locked in its place among the receivers, not first,
+        # so a transfer from a lower-pk receiver to the sender can't deadlock us
+        ledger.lock({sender_wallet.pk} | {row["wallet"].pk for row in rows if "wallet" in row})
+        sender = Wallet.objects.get(pk=sender_wallet.pk)
+
+        if all_or_nothing:
+            failed = any("error" in row for row in rows)
+            if not failed and sum(row["amount"] for row in rows) > sender.balance:
+                for row in rows:
+                    row["error"] = "Insufficient balance"
+            elif failed:
+                for row in rows:
+                    row.setdefault("error", "Batch rejected")
+        else:
+            remaining = sender.balance
+            for row in rows:
+                if "error" in row:
+                    continue
+                if row["amount"] > remaining:
+                    row["error"] = "Insufficient balance"
+                else:
+                    remaining -= row["amount"]
+
+        accepted = [row for row in rows if "error" not in row]
+        if accepted:
+            transactions = Transaction.objects.bulk_create(
+                [
+                    Transaction(
+                        sender=sender,
+                        receiver=row["wallet"],
+                        amount_sent=row["amount"],
+                        amount_received=row["converted"],
+                        from_currency=sender.currency,
+                        to_currency=row["wallet"].currency,
+                        sender_email=sender_wallet.user.email,
+                        receiver_email=row["receiver_email"]
+                    )
+                    for row in accepted
+                ],
+                batch_size=ledger.CHUNK_SIZE
+            )
+
+            entries = []
+            for row, transaction in zip(accepted, transactions):
+                row["transaction"] = transaction
+                entries.append(LedgerEntry(
+                    wallet_id=sender.pk,
+                    amount=-row["amount"],
+                    kind=LedgerEntry.TRANSFER_OUT,
+                    transaction=transaction
+                ))
+                entries.append(LedgerEntry(
+                    wallet_id=row["wallet"].pk,
+                    amount=row["converted"],
+                    kind=LedgerEntry.TRANSFER_IN,
+                    transaction=transaction
+                ))
+            ledger.post(entries)
+            stats.record(transactions)
+
+    results = []
+    for row in rows:
+        if "error" in row:
+            results.append({
+                "index": row["index"],
+                "receiver_email": row["receiver_email"],
+                "status": "failed",
+                "error": row["error"],
+            })
+        else:
+            results.append({
+                "index": row["index"],
+                "receiver_email": row["receiver_email"],
+                "status": "sent",
+                "transaction_id": row["transaction"].pk,
+                "sent": row["amount"],
+                "received": row["converted"],
+            })
+    return results
+
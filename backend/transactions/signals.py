@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from .models import Transaction
+
+
+@receiver(post_save, sender=User)
+def sync_transaction_emails(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the denormalized emails on past transactions in step with the user's."""
+    if created or (update_fields is not None and "email" not in update_fields):
+        return
+
+    Transaction.objects.filter(sender__user=instance).exclude(sender_email=instance.email).update(
+        sender_email=instance.email
+    )
+    Transaction.objects.filter(receiver__user=instance).exclude(receiver_email=instance.email).update(
+        receiver_email=instance.email
+    )
@@ -0,0 +1,131 @@
+"""
+Per-user, per-currency transfer totals behind /api/analytics/.
+
+record() folds new transfers into TransactionStats with F() increments
+inside the caller's transaction, so the dashboard reads a handful of
+rows instead of aggregating the user's whole history. rebuild()
+recomputes the rows from the Transaction table with totals(), which the
+backfill migration shares.
+"""
+from collections import defaultdict
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, F, Q, Sum
+
+from wallet import ledger
+from wallet.models import Wallet
+from .models import Transaction, TransactionStats
+
+REBUILD_BATCH = 500
+
+_FIELDS = ("total_sent", "total_received", "sent_count", "received_count", "transaction_count")
+
+
+def _deltas(transactions):
+    deltas = defaultdict(lambda: dict.fromkeys(_FIELDS, 0))
+    for transaction in transactions:
+        sender_user_id = transaction.sender.user_id
+        receiver_user_id = transaction.receiver.user_id
+
+        sent = deltas[(sender_user_id, transaction.from_currency)]
+        sent["total_sent"] += transaction.amount_sent
+        sent["sent_count"] += 1
+        sent["transaction_count"] += 1
+
+        received = deltas[(receiver_user_id, transaction.to_currency)]
+        received["total_received"] += transaction.amount_received
+        received["received_count"] += 1
+        if receiver_user_id != sender_user_id:
+            received["transaction_count"] += 1
+    return deltas
+
+
+def record(transactions):
+    """Add saved Transactions, with sender and receiver wallets loaded, to the stats."""
+    deltas = _deltas(transactions)
+
+    with db_transaction.atomic():
+        TransactionStats.objects.bulk_create(
+            [TransactionStats(user_id=user_id, currency=currency) for user_id, currency in deltas],
+            ignore_conflicts=True
+        )
+        # sorted, so concurrent transfers lock stats rows in the same order
+        for (user_id, currency), delta in sorted(deltas.items()):
+            TransactionStats.objects.filter(user_id=user_id, currency=currency).update(**{
+                field: F(field) + value for field, value in delta.items() if value
+            })
+
+
+def totals(transactions):
+    """
+    Aggregate a Transaction queryset into stats fields keyed by (user id,
+    currency). Only field lookups are used, so migrations can pass
+    historical models.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(_FIELDS, 0))
+
+    sent = (
+        transactions.values("sender__user_id", "from_currency")
+        .annotate(total=Sum("amount_sent"), count=Count("id"))
+    )
+    for row in sent:
+        delta = deltas[(row["sender__user_id"], row["from_currency"])]
+        delta.update(total_sent=row["total"], sent_count=row["count"], transaction_count=row["count"])
+
+    received = (
+        transactions.values("receiver__user_id", "to_currency")
+        .annotate(
+            total=Sum("amount_received"),
+            count=Count("id"),
+            others=Count("id", filter=~Q(sender__user_id=F("receiver__user_id")))
+        )
+    )
+    for row in received:
+        delta = deltas[(row["receiver__user_id"], row["to_currency"])]
+        delta.update(total_received=row["total"], received_count=row["count"])
+        delta["transaction_count"] += row["others"]
+    return deltas
+
+
+def _rebuild_batch(user_ids):
+    with db_transaction.atomic():
+        # transfers touching these users post to their wallets, so holding
+        # the wallet locks keeps them out until the batch commits
+        ledger.lock(list(Wallet.objects.filter(user_id__in=user_ids).values_list("pk", flat=True)))
+        deltas = totals(Transaction.objects.filter(
+            Q(sender__user__in=user_ids) | Q(receiver__user__in=user_ids)
+        ))
+        batch = set(user_ids)
+        TransactionStats.objects.filter(user_id__in=user_ids).delete()
+        rows = TransactionStats.objects.bulk_create(
+            [
+                TransactionStats(user_id=user_id, currency=currency, **delta)
+                for (user_id, currency), delta in deltas.items()
+                if user_id in batch
+            ],
+            batch_size=1000
+        )
+    return len(rows)
+
+
+def rebuild(user_ids=None):
+    """
+    Recompute stats from the Transaction table, for every user or just
+    `user_ids`. Returns the number of rows written.
+
+    Users are rebuilt REBUILD_BATCH at a time, each batch in one
+    transaction that first locks the batch's wallets through the ledger.
+    Transfers already holding one of those locks commit before the batch
+    is counted, and later ones wait and add to the rebuilt rows, so this
+    is safe to run with transfers live.
+    """
+    if user_ids is None:
+        user_ids = (
+            set(Wallet.objects.values_list("user_id", flat=True))
+            | set(TransactionStats.objects.values_list("user_id", flat=True))
+        )
+    user_ids = sorted(user_ids)
+    return sum(
+        _rebuild_batch(user_ids[start:start + REBUILD_BATCH])
+        for start in range(0, len(user_ids), REBUILD_BATCH)
+    )
@@ -1,3 +1,624 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import ProtectedError
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from django.contrib.auth import get_user_model
+from currency import quotes
+from currency.models import Currency
+from wallet import ledger
+from wallet.models import LedgerEntry, Wallet
+from . import jobs
+from .services import transfer
+from .models import ExportJob, IdempotencyKey, Transaction, TransactionStats, TransferJob
+from .serializers import TransactionSerializer, encode_transactions, listing_rows
 
-# Create your tests here.
+User = get_user_model()
+
+class SendMoneyTest(APITestCase):
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', rate_to_base=1.0)
+        Currency.objects.create(code='INR', name='Indian Rupee', rate_to_base=83.0)
+
+        self.sender = User.objects.create_user(email='sender@example.com', password='testpass')
+        self.receiver = User.objects.create_user(email='receiver@example.com', password='testpass')
+        self.sender_wallet = Wallet.objects.create(user=self.sender, currency='USD', balance=100)
+        self.receiver_wallet = Wallet.objects.create(user=self.receiver, currency='INR', balance=0)
+
+        self.client.force_authenticate(user=self.sender)
+
+    def send(self, amount, headers=None, **extra):
+        data = {
+            'receiver_email': 'receiver@example.com',
+            'from_currency': 'USD',
+            'to_currency': 'INR',
+            'amount': amount,
+            **extra
+        }
+        return self.client.post('/api/send-money/', data, format='json', headers=headers)
+
+    def test_send_money(self):
+        response = self.send(10)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['received'], Decimal('830.00'))
+
+        self.sender_wallet.refresh_from_db()
+        self.receiver_wallet.refresh_from_db()
+        self.assertEqual(self.sender_wallet.balance, Decimal('90.00'))
+        self.assertEqual(self.receiver_wallet.balance, Decimal('830.00'))
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_insufficient_balance(self):
+        response = self.send(100.01)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.sender_wallet.refresh_from_db()
+        self.assertEqual(self.sender_wallet.balance, Decimal('100.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_idempotent_retry_is_replayed(self):
+        first = self.send(10, headers={'Idempotency-Key': 'abc'})
+        retry = self.send(10, headers={'Idempotency-Key': 'abc'})
+
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+        self.sender_wallet.refresh_from_db()
+        self.assertEqual(self.sender_wallet.balance, Decimal('90.00'))
+
+    def test_idempotency_key_reused_for_other_request(self):
+        self.send(10, headers={'Idempotency-Key': 'abc'})
+        response = self.send(20, headers={'Idempotency-Key': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_unfinished_idempotency_key_is_leased(self):
+        self.send(10, headers={'Idempotency-Key': 'first'})
+        # a claim whose request is still running, or died before committing
+        # anything: its response and its transfer commit together
+        IdempotencyKey.objects.create(
+            user=self.sender, key='abc', request_hash=IdempotencyKey.objects.get().request_hash,
+            expires_at=timezone.now() + timedelta(seconds=30)
+        )
+        with self.settings(IDEMPOTENCY_WAIT_SECONDS=0):
+            response = self.send(10, headers={'Idempotency-Key': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+        # once the lease runs out a retry takes the key over
+        IdempotencyKey.objects.filter(key='abc').update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.send(10, headers={'Idempotency-Key': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Transaction.objects.count(), 2)
+
+        record = IdempotencyKey.objects.get(key='abc')
+        self.assertEqual(record.status_code, status.HTTP_200_OK)
+        self.assertGreater(record.expires_at, timezone.now() + timedelta(hours=23))
+
+    def test_failed_idempotent_request_moves_no_money(self):
+        # fails after the transfer was written
+        with mock.patch('transactions.views.logger.info', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.send(10, headers={'Idempotency-Key': 'abc'})
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        response = self.send(10, headers={'Idempotency-Key': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.sender_wallet.refresh_from_db()
+        self.assertEqual(self.sender_wallet.balance, Decimal('90.00'))
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_prune_expired_idempotency_keys(self):
+        self.send(10, headers={'Idempotency-Key': 'abc'})
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+
+        call_command('prune_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_ledger_protects_transactions(self):
+        self.send(10)
+        with self.assertRaises(ProtectedError):
+            Transaction.objects.get().delete()
+        self.assertEqual(LedgerEntry.objects.filter(transaction__isnull=False).count(), 2)
+
+    def test_rejects_non_positive_amount(self):
+        response = self.send(-10)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_send_with_quote_uses_locked_rate(self):
+        quote = self.client.post('/api/quotes/', {
+            'from_currency': 'USD', 'to_currency': 'INR', 'amount': '10.00'
+        }, format='json')
+        self.assertEqual(quote.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(quote.data['converted_amount'], Decimal('830.00'))
+
+        currency = Currency.objects.get(code='INR')
+        currency.rate_to_base = 90.0
+        currency.save()
+
+        response = self.send(10, quote_id=quote.data['quote_id'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['received'], Decimal('830.00'))
+
+        # a quote executes once
+        response = self.send(10, quote_id=quote.data['quote_id'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_quote_must_match_transfer(self):
+        quote = self.client.post('/api/quotes/', {
+            'from_currency': 'USD', 'to_currency': 'INR', 'amount': '10.00'
+        }, format='json')
+
+        response = self.send(20, quote_id=quote.data['quote_id'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.assertRaises(quotes.QuoteNotFound):
+            quotes.consume(quote.data['quote_id'], self.receiver)
+
+        # the mismatched attempt put the quote back for its owner
+        response = self.send(10, quote_id=quote.data['quote_id'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_async_transfer(self):
+        response = self.send(10, headers={'Prefer': 'respond-async'})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(Transaction.objects.exists())
+
+        url = f"/api/transfers/{response.data['transfer_id']}/"
+        self.assertEqual(response['Location'], url)
+        self.assertEqual(self.client.get(url).data['status'], TransferJob.PENDING)
+
+        claimed = jobs.claim(10)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(jobs.claim(10), [])
+        self.assertEqual(jobs.run(claimed[0]), TransferJob.COMPLETED)
+
+        status_response = self.client.get(url)
+        self.assertEqual(status_response.data['status'], TransferJob.COMPLETED)
+        self.assertEqual(status_response.data['transaction'], Transaction.objects.get().pk)
+        self.sender_wallet.refresh_from_db()
+        self.assertEqual(self.sender_wallet.balance, Decimal('90.00'))
+
+    def test_async_transfer_failure(self):
+        response = self.send(150, headers={'Prefer': 'respond-async'})
+        for job in jobs.claim(10):
+            jobs.run(job)
+
+        status_response = self.client.get(f"/api/transfers/{response.data['transfer_id']}/")
+        self.assertEqual(status_response.data['status'], TransferJob.FAILED)
+        self.assertEqual(status_response.data['error'], 'Insufficient balance')
+
+        self.client.force_authenticate(user=self.receiver)
+        other = self.client.get(f"/api/transfers/{response.data['transfer_id']}/")
+        self.assertEqual(other.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_failed_async_transfer_releases_quote(self):
+        quote = self.client.post('/api/quotes/', {
+            'from_currency': 'USD', 'to_currency': 'INR', 'amount': '150.00'
+        }, format='json')
+        self.send(150, quote_id=quote.data['quote_id'], headers={'Prefer': 'respond-async'})
+        for job in jobs.claim(10):
+            self.assertEqual(jobs.run(job), TransferJob.FAILED)
+
+        released = quotes.consume(quote.data['quote_id'], self.sender)
+        self.assertEqual(released.amount, Decimal('150.00'))
+        self.assertEqual(released.converted, Decimal(quote.data['converted_amount']))
+
+    def test_stale_claim_is_reclaimed(self):
+        self.send(10, headers={'Prefer': 'respond-async'})
+        stale = jobs.claim(10)[0]
+        TransferJob.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+
+        fresh = jobs.claim(10)[0]
+        self.assertEqual(jobs.run(stale), TransferJob.PROCESSING)
+        self.assertEqual(jobs.run(fresh), TransferJob.COMPLETED)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+
+class BulkSendMoneyTest(APITestCase):
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', rate_to_base=1.0)
+        Currency.objects.create(code='INR', name='Indian Rupee', rate_to_base=83.0)
+
+        self.sender = User.objects.create_user(email='sender@example.com', password='testpass')
+        self.sender_wallet = Wallet.objects.create(user=self.sender, currency='USD', balance=100)
+        self.receivers = []
+        for i in range(6):
+            user = User.objects.create_user(email=f'r{i}@example.com', password='testpass')
+            self.receivers.append(Wallet.objects.create(user=user, currency='INR'))
+
+        self.client.force_authenticate(user=self.sender)
+
+    def payout(self, items, **extra):
+        data = {'from_currency': 'USD', 'items': items, **extra}
+        return self.client.post('/api/send-money/bulk/', data, format='json')
+
+    def test_partial_payout(self):
+        items = [{'receiver_email': f'r{i}@example.com', 'to_currency': 'INR', 'amount': 20} for i in range(6)]
+        items.append({'receiver_email': 'nobody@example.com', 'to_currency': 'INR', 'amount': 1})
+
+        response = self.payout(items)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['sent_count'], 5)
+        self.assertEqual(
+            [r['error'] for r in response.data['results'] if r['status'] == 'failed'],
+            ['Insufficient balance', 'Receiver wallet not found']
+        )
+
+        self.sender_wallet.refresh_from_db()
+        self.assertEqual(self.sender_wallet.balance, 0)
+        self.assertEqual(Wallet.objects.get(pk=self.receivers[0].pk).balance, Decimal('1660.00'))
+        self.assertEqual(Transaction.objects.count(), 5)
+
+    def test_sharded_sender_and_receiver(self):
+        ledger.set_shard_count(self.sender_wallet.pk, 2)
+        ledger.set_shard_count(self.receivers[0].pk, 2)
+        ledger.post([LedgerEntry(wallet_id=self.sender_wallet.pk, amount=50, kind=LedgerEntry.TOPUP)])
+
+        items = [{'receiver_email': f'r{i}@example.com', 'to_currency': 'INR', 'amount': 75} for i in range(2)]
+        response = self.payout(items)
+
+        self.assertEqual(response.data['sent_count'], 2)
+        self.assertEqual(Wallet.objects.get(pk=self.sender_wallet.pk).total_balance, 0)
+        self.assertEqual(Wallet.objects.get(pk=self.receivers[0].pk).total_balance, Decimal('6225.00'))
+
+    def test_all_or_nothing(self):
+        items = [
+            {'receiver_email': 'r0@example.com', 'to_currency': 'INR', 'amount': 10},
+            {'receiver_email': 'r1@example.com', 'to_currency': 'XXX', 'amount': 10},
+        ]
+        response = self.payout(items, all_or_nothing=True)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.sender_wallet.refresh_from_db()
+        self.assertEqual(self.sender_wallet.balance, 100)
+        self.assertFalse(Transaction.objects.exists())
+
+
+class TransactionHistoryTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='me@example.com', password='testpass')
+        other = User.objects.create_user(email='other@example.com', password='testpass')
+        usd = Wallet.objects.create(user=self.user, currency='USD')
+        eur = Wallet.objects.create(user=self.user, currency='EUR')
+        theirs = Wallet.objects.create(user=other, currency='USD')
+
+        # sent, received and between own wallets, all at the same instant
+        # so pages have to break ties on id
+        pairs = [(usd, theirs), (theirs, eur), (usd, eur)] * 5
+        Transaction.objects.bulk_create([
+            Transaction(sender=sender, receiver=receiver, amount_sent=1, amount_received=1,
+                        from_currency=sender.currency, to_currency=receiver.currency,
+                        sender_email=sender.user.email, receiver_email=receiver.user.email)
+            for sender, receiver in pairs
+        ])
+        Transaction.objects.update(created_at=timezone.now())
+        self.client.force_authenticate(user=self.user)
+
+    def test_pages_cover_history_once(self):
+        ids = []
+        url = '/api/transactions/?page_size=4'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data), 4)
+            ids += [row['id'] for row in response.data]
+            url = response.get('Link', '').partition('<')[2].partition('>')[0]
+
+        expected = list(Transaction.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_limit_alias_and_type_filter(self):
+        response = self.client.get('/api/transactions/?limit=2&type=sent')
+        self.assertEqual(len(response.data), 2)
+        self.assertTrue(all(row['type'] == 'sent' for row in response.data))
+        self.assertIn('X-Next-Cursor', response)
+
+    def test_listing_joins_nothing(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/transactions/?page_size=100')
+        self.assertNotIn('JOIN', queries[-1]['sql'])
+
+    def test_admin_listing_is_paged(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='testpass')
+        self.client.force_authenticate(user=admin)
+
+        ids = []
+        url = '/api/admin-ui/transactions/?page_size=4'
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data), 4)
+            ids += [row['id'] for row in response.data]
+            url = response.get('Link', '').partition('<')[2].partition('>')[0]
+        self.assertEqual(ids, list(Transaction.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/transactions/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search(self):
+        response = self.client.get('/api/transactions/?search=ther@exa&page_size=100')
+        self.assertEqual(len(response.data), 10)
+
+        response = self.client.get('/api/transactions/?search=EU&page_size=100')
+        self.assertEqual(len(response.data), 10)
+
+    def test_search_matches_once(self):
+        strangers = [
+            Wallet.objects.create(user=User.objects.create_user(email=email, password='testpass'), currency='USD')
+            for email in ('brother@example.com', 'mother@example.com')
+        ]
+        Transaction.objects.create(sender=strangers[0], receiver=strangers[1], amount_sent=1, amount_received=1,
+                                   from_currency='USD', to_currency='USD')
+        Transaction.objects.filter(sender=strangers[0]).update(sender_email='brother@example.com', receiver_email='mother@example.com')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/transactions/?search=ther@exa&page_size=100')
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(sum('MATCH' in query['sql'] for query in queries), 1)
+
+        # a term too common to filter on its ids is checked row by row
+        with mock.patch('transactions.search.MAX_MATCH_IDS', 2):
+            response = self.client.get('/api/transactions/?search=ther@exa&page_size=100')
+        self.assertEqual(len(response.data), 10)
+
+    def test_email_change_updates_search_columns(self):
+        self.user.email = 'renamed@example.com'
+        self.user.save()
+
+        response = self.client.get('/api/transactions/?search=renamed&page_size=100&type=sent')
+        self.assertEqual(len(response.data), 10)
+
+    def test_listing_encoder_matches_serializer(self):
+        Transaction.objects.update(amount_sent=Decimal('12.5'), amount_received=Decimal('1037.46'))
+        transactions = Transaction.objects.order_by('id')
+        request = self.client.get('/api/transactions/').wsgi_request
+        request.user = self.user
+
+        expected = TransactionSerializer(transactions, many=True, context={'request': request}).data
+        wallet_ids = Wallet.objects.filter(user=self.user).values_list('id', flat=True)
+        actual = encode_transactions(listing_rows(transactions), wallet_ids)
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+
+class AnalyticsTest(APITestCase):
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', rate_to_base=1.0)
+        Currency.objects.create(code='INR', name='Indian Rupee', rate_to_base=83.0)
+
+        self.user = User.objects.create_user(email='me@example.com', password='testpass')
+        other = User.objects.create_user(email='other@example.com', password='testpass')
+        self.usd = Wallet.objects.create(user=self.user, currency='USD')
+        self.inr = Wallet.objects.create(user=self.user, currency='INR')
+        self.theirs = Wallet.objects.create(user=other, currency='USD')
+        ledger.post([LedgerEntry(wallet=self.usd, amount=100, kind=LedgerEntry.OPENING),
+                     LedgerEntry(wallet=self.theirs, amount=100, kind=LedgerEntry.OPENING)])
+        self.client.force_authenticate(user=self.user)
+
+        self.client.post('/api/send-money/', {
+            'receiver_email': 'other@example.com', 'from_currency': 'USD', 'to_currency': 'USD', 'amount': 10
+        }, format='json')
+        self.client.post('/api/send-money/', {
+            'receiver_email': 'me@example.com', 'from_currency': 'USD', 'to_currency': 'INR', 'amount': 1
+        }, format='json')
+        transfer(self.theirs, self.usd, Decimal('5.00'), Decimal('5.00'))
+
+    def test_analytics_from_stats(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/analytics/')
+
+        self.assertEqual(response.data['total_sent'], Decimal('11.00'))
+        self.assertEqual(response.data['total_received'], Decimal('88.00'))
+        self.assertEqual(response.data['transaction_count'], 3)
+        self.assertEqual(
+            [(row['currency'], row['transaction_count']) for row in response.data['by_currency']],
+            [('INR', 0), ('USD', 3)]
+        )
+
+    def test_rebuild_matches_incremental(self):
+        def stats_rows():
+            return sorted(TransactionStats.objects.values_list(
+                'user_id', 'currency', 'total_sent', 'total_received', 'sent_count', 'received_count', 'transaction_count'
+            ))
+
+        incremental = stats_rows()
+        call_command('rebuild_analytics', stdout=StringIO())
+        self.assertEqual(stats_rows(), incremental)
+
+        with mock.patch('transactions.stats.REBUILD_BATCH', 1):
+            call_command('rebuild_analytics', stdout=StringIO())
+        self.assertEqual(stats_rows(), incremental)
+
+        # the migration backfilling stats for transfers made before them
+        TransactionStats.objects.update(total_sent=0, sent_count=0)
+        import_module('transactions.migrations.0009_backfill_transactionstats').backfill(apps, None)
+        self.assertEqual(stats_rows(), incremental)
+
+    def test_series_by_day(self):
+        Transaction.objects.filter(amount_sent=10).update(created_at=datetime(2026, 3, 2, 23, 0, tzinfo=dt_timezone.utc))
+        Transaction.objects.exclude(amount_sent=10).update(created_at=datetime(2026, 3, 4, 9, 0, tzinfo=dt_timezone.utc))
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/analytics/', {
+                'bucket': 'day', 'from': '2026-03-01', 'to': '2026-03-04', 'currency': 'usd'
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['buckets'], ['2026-03-01', '2026-03-02', '2026-03-03', '2026-03-04'])
+        [usd] = response.data['series']
+        self.assertEqual(usd['currency'], 'USD')
+        self.assertEqual(usd['sent'], [0, Decimal('10.00'), 0, Decimal('1.00')])
+        self.assertEqual(usd['sent_count'], [0, 1, 0, 1])
+        self.assertEqual(usd['received'], [0, 0, 0, Decimal('5.00')])
+        self.assertEqual(usd['received_count'], [0, 0, 0, 1])
+
+    def test_series_by_month(self):
+        Transaction.objects.update(created_at=datetime(2026, 2, 10, tzinfo=dt_timezone.utc))
+
+        response = self.client.get('/api/analytics/', {'bucket': 'month', 'from': '2026-01-15', 'to': '2026-03-01'})
+
+        self.assertEqual(response.data['buckets'], ['2026-01-01', '2026-02-01', '2026-03-01'])
+        self.assertEqual(
+            [(row['currency'], row['sent_count'], row['received_count']) for row in response.data['series']],
+            [('INR', [0, 0, 0], [0, 1, 0]), ('USD', [0, 2, 0], [0, 1, 0])]
+        )
+
+    def test_series_rejects_bad_parameters(self):
+        for params in ({'bucket': 'year'}, {'bucket': 'day', 'from': 'yesterday'},
+                       {'bucket': 'day', 'from': '2026-03-02', 'to': '2026-03-01'},
+                       {'bucket': 'day', 'from': '2000-01-01', 'to': '2026-01-01'},
+                       {'bucket': 'day', 'from': '0001-01-01'},
+                       {'bucket': 'week', 'to': '9999-12-31'}):
+            response = self.client.get('/api/analytics/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_series_at_the_ends_of_the_calendar(self):
+        for params, buckets in (({'bucket': 'month', 'from': '9999-11-01', 'to': '9999-12-30'}, ['9999-11-01', '9999-12-01']),
+                                ({'bucket': 'week', 'to': '0001-01-10'}, ['0001-01-01', '0001-01-08'])):
+            response = self.client.get('/api/analytics/', params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, params)
+            self.assertEqual(response.data['buckets'], buckets)
+
+
+class ExportTest(APITestCase):
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', rate_to_base=1.0)
+        Currency.objects.create(code='INR', name='Indian Rupee', rate_to_base=83.0)
+
+        self.user = User.objects.create_user(email='me@example.com', password='testpass')
+        other = User.objects.create_user(email='other@example.com', password='testpass')
+        usd = Wallet.objects.create(user=self.user, currency='USD')
+        inr = Wallet.objects.create(user=self.user, currency='INR')
+        theirs = Wallet.objects.create(user=other, currency='USD')
+        ledger.post([LedgerEntry(wallet=usd, amount=100, kind=LedgerEntry.OPENING),
+                     LedgerEntry(wallet=theirs, amount=100, kind=LedgerEntry.OPENING)])
+
+        for day, (sender, receiver, amount) in enumerate(
+            [(usd, theirs, '10.00'), (theirs, usd, '5.00'), (usd, inr, '1.00')], start=1
+        ):
+            received = Decimal(amount) * (83 if receiver == inr else 1)
+            transaction = transfer(sender, receiver, Decimal(amount), received)
+            Transaction.objects.filter(pk=transaction.pk).update(
+                created_at=datetime(2026, 3, day, 12, 0, tzinfo=dt_timezone.utc)
+            )
+        self.client.force_authenticate(user=self.user)
+
+    def download(self, params=None, **headers):
+        response = self.client.get('/api/export/', params or {}, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_newest_first(self):
+        response, content = self.download()
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(content.decode().splitlines(), [
+            'Date,Type,Amount Sent,Currency Sent,Amount Received,Currency Received,From/To',
+            '2026-03-03 12:00:00,Sent,1.00,USD,,,me@example.com',
+            '2026-03-02 12:00:00,Received,,,5.00,USD,other@example.com',
+            '2026-03-01 12:00:00,Sent,10.00,USD,,,other@example.com',
+        ])
+
+    def test_ndjson_matches_history(self):
+        _, content = self.download({'output': 'ndjson'})
+
+        history = self.client.get('/api/transactions/').data
+        self.assertEqual([json.loads(line) for line in content.decode().splitlines()], history)
+
+    def test_date_range_and_gzip(self):
+        response, content = self.download({'from': '2026-03-02', 'to': '2026-03-02'}, accept_encoding='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(content).decode().splitlines()[1:], [
+            '2026-03-02 12:00:00,Received,,,5.00,USD,other@example.com',
+        ])
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'output': 'xml'}, {'from': 'march'}, {'to': '9999-12-31'}):
+            response = self.client.get('/api/export/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def export_job(self, **data):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = self.settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        response = self.client.post('/api/exports/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response['Location'], f"/api/exports/{response.data['id']}/")
+        self.assertEqual(response.data['status'], ExportJob.PENDING)
+        return ExportJob.objects.get(pk=response.data['id'])
+
+    def test_export_job_download_and_resume(self):
+        job = self.export_job(output='ndjson')
+        self.assertEqual(self.client.get(f'/api/exports/{job.pk}/download/').status_code, status.HTTP_409_CONFLICT)
+
+        call_command('process_exports', '--once', stdout=StringIO())
+
+        job_status = self.client.get(f'/api/exports/{job.pk}/').data
+        self.assertEqual(job_status['status'], ExportJob.COMPLETED)
+        self.assertEqual(job_status['row_count'], 3)
+        _, streamed = self.download({'output': 'ndjson'})
+
+        full = self.client.get(f'/api/exports/{job.pk}/download/')
+        self.assertEqual(full.status_code, status.HTTP_200_OK)
+        self.assertEqual(full['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(full.streaming_content), streamed)
+        self.assertEqual(job_status['size'], len(streamed))
+
+        resumed = self.client.get(f'/api/exports/{job.pk}/download/', headers={'range': 'bytes=100-', 'if-range': full['ETag']})
+        self.assertEqual(resumed.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(resumed['Content-Range'], f'bytes 100-{len(streamed) - 1}/{len(streamed)}')
+        self.assertEqual(b''.join(resumed.streaming_content), streamed[100:])
+
+        changed = self.client.get(f'/api/exports/{job.pk}/download/', headers={'range': 'bytes=100-', 'if-range': '"other"'})
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+
+        beyond = self.client.get(f'/api/exports/{job.pk}/download/', headers={'range': f'bytes={len(streamed)}-'})
+        self.assertEqual(beyond.status_code, 416)
+        self.assertEqual(beyond['Content-Range'], f'bytes */{len(streamed)}')
+
+    def test_export_job_belongs_to_its_user(self):
+        job = self.export_job()
+        self.client.force_authenticate(user=User.objects.get(email='other@example.com'))
+
+        self.assertEqual(self.client.get(f'/api/exports/{job.pk}/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(f'/api/exports/{job.pk}/download/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_purge_exports(self):
+        job = self.export_job(**{'from': '2026-03-02'})
+        call_command('process_exports', '--once', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.row_count, 2)
+        path = job.file.path
+        orphan = os.path.join(os.path.dirname(path), 'crashed.csv.part')
+        open(orphan, 'w').close()
+
+        call_command('purge_exports', stdout=StringIO())
+        self.assertTrue(ExportJob.objects.filter(pk=job.pk).exists())
+
+        ExportJob.objects.filter(pk=job.pk).update(finished_at=timezone.now() - timedelta(days=30))
+        os.utime(orphan, (0, 0))
+        call_command('purge_exports', stdout=StringIO())
+        self.assertFalse(ExportJob.objects.filter(pk=job.pk).exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(orphan))
@@ -1,9 +1,17 @@
 from django.urls import path
-from .views import send_money, transaction_history, analytics, export_transactions
+from .views import (
+    send_money, send_money_bulk, transfer_status, transaction_history, analytics, export_transactions,
+    create_export, export_status, download_export
+)
 
 urlpatterns = [
     path("send-money/", send_money),
+    path("send-money/bulk/", send_money_bulk),
+    path("transfers/<int:job_id>/", transfer_status),
     path("transactions/", transaction_history),
     path("analytics/", analytics),
     path("export/", export_transactions),
+    path("exports/", create_export),
+    path("exports/<int:job_id>/", export_status),
+    path("exports/<int:job_id>/download/", download_export),
 ]
@@ -1,23 +1,37 @@
+from datetime import date
 from decimal import Decimal
-from django.db import transaction as db_transaction
-from django.db.models import Sum, Q
-from django.http import HttpResponse
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 import logging
-import csv
+import re
 
 logger = logging.getLogger(__name__)
 
 from accounts.models import User
 from wallet.models import Wallet
+from currency import engine, quotes
 from currency.models import Currency
-from .models import Transaction
-from .serializers import SendMoneySerializer, TransactionSerializer
+from currency.rates import rate_table
+from .models import ExportJob, Transaction, TransactionStats, TransferJob
+from .search import search as search_transactions
+from .pagination import InvalidCursor, keyset_page, link_next, page_request
+from .serializers import (
+    BulkSendMoneySerializer, ExportJobSerializer, SendMoneySerializer, TransferJobSerializer,
+    encode_transactions, listing_rows
+)
+from . import export, export_jobs, jobs, ranges, series
+from .idempotency import idempotent
+from .services import InsufficientBalance, bulk_transfer, transfer
 
 
 @api_view(["POST"])
+@idempotent
 def send_money(request):
     serializer = SendMoneySerializer(data=request.data)
 
@@ -28,7 +42,7 @@ def send_money(request):
     data = serializer.validated_data
 
     try:
-        sender_wallet = Wallet.objects.get(
+        sender_wallet = Wallet.objects.select_related("user").get(
             user=sender_user,
             currency=data["from_currency"].upper()
         )
@@ -40,7 +54,7 @@ def send_money(request):
 
     try:
         receiver_user = User.objects.get(email=data["receiver_email"])
-        receiver_wallet = Wallet.objects.get(
+        receiver_wallet = Wallet.objects.select_related("user").get(
             user=receiver_user,
             currency=data["to_currency"].upper()
         )
@@ -52,145 +66,328 @@ def send_money(request):
 
     amount = data["amount"]
 
-    if sender_wallet.balance < amount:
+    from_code = data["from_currency"].upper()
+    to_code = data["to_currency"].upper()
+
+    quote = None
+    if "quote_id" in data:
+        # execute at the rate locked by the quote
+        try:
+            quote = quotes.consume(data["quote_id"], sender_user)
+        except quotes.QuoteNotFound:
+            return Response(
+                {"error": "Quote not found or expired"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (quote.from_currency, quote.to_currency, quote.amount) != (from_code, to_code, amount):
+            quotes.release(quote)
+            return Response(
+                {"error": "Quote does not match the transfer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        converted_amount = quote.converted
+    else:
+        # get currency rates
+        try:
+            from_rate = rate_table.get_scaled(from_code)
+            to_rate = rate_table.get_scaled(to_code)
+        except Currency.DoesNotExist:
+            return Response(
+                {"error": "Invalid currency code"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # conversion
+        converted_amount = engine.convert(amount, from_rate, to_rate)
+
+    # Prefer: respond-async queues the transfer for the process_transfers worker
+    if "respond-async" in request.headers.get("Prefer", ""):
+        job = jobs.enqueue(sender_wallet, receiver_wallet, amount, converted_amount, quote)
+        logger.info(f"Transfer queued: job {job.pk}, {sender_user.email} sending {amount} {from_code} to {receiver_user.email}")
+        location = f"/api/transfers/{job.pk}/"
+        return Response(
+            {
+                "message": "Transfer queued",
+                "transfer_id": job.pk,
+                "status": job.status,
+                "status_url": request.build_absolute_uri(location),
+            },
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": location}
+        )
+
+    try:
+        transfer(sender_wallet, receiver_wallet, amount, converted_amount)
+    except InsufficientBalance:
+        if quote:
+            quotes.release(quote)
         return Response(
             {"error": "Insufficient balance"},
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # get currency rates
-    from_currency = Currency.objects.get(code=data["from_currency"].upper())
-    to_currency = Currency.objects.get(code=data["to_currency"].upper())
+    logger.info(f"Money sent: {sender_user.email} sent {amount} {from_code} to {receiver_user.email}, received {converted_amount} {to_code}")
 
-    # conversion
-    amount_in_base = amount / from_currency.rate_to_base
-    converted_amount = amount_in_base * to_currency.rate_to_base
+    return Response({
+        "message": "Money sent successfully",
+        "sent": amount,
+        "received": converted_amount,
+        "to": receiver_user.email
+    })
 
-    # atomic DB transaction
-    with db_transaction.atomic():
-        sender_wallet.balance -= amount
-        receiver_wallet.balance += converted_amount
+@api_view(["POST"])
+@idempotent
+def send_money_bulk(request):
+    serializer = BulkSendMoneySerializer(data=request.data)
 
-        sender_wallet.save()
-        receiver_wallet.save()
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        Transaction.objects.create(
-            sender=sender_wallet,
-            receiver=receiver_wallet,
-            amount_sent=amount,
-            amount_received=round(converted_amount, 2),
-            from_currency=from_currency.code,
-            to_currency=to_currency.code
+    data = serializer.validated_data
+
+    try:
+        sender_wallet = Wallet.objects.select_related("user").get(
+            user=request.user,
+            currency=data["from_currency"].upper()
+        )
+    except Wallet.DoesNotExist:
+        return Response(
+            {"error": "Sender wallet not found"},
+            status=status.HTTP_400_BAD_REQUEST
         )
 
-    logger.info(f"Money sent: {sender_user.email} sent {amount} {from_currency.code} to {receiver_user.email}, received {round(converted_amount, 2)} {to_currency.code}")
+    results = bulk_transfer(sender_wallet, data["items"], data["all_or_nothing"])
+    sent = [r for r in results if r["status"] == "sent"]
 
-    return Response({
-        "message": "Money sent successfully",
-        "sent": amount,
-        "received": round(converted_amount, 2),
-        "to": receiver_user.email
-    })
+    logger.info(f"Bulk payout: {request.user.email} sent {len(sent)} of {len(results)} payouts from {sender_wallet.currency}")
+
+    return Response(
+        {
+            "sent_count": len(sent),
+            "failed_count": len(results) - len(sent),
+            "total_sent": sum((r["sent"] for r in sent), Decimal("0.00")),
+            "results": results,
+        },
+        status=status.HTTP_200_OK if sent else status.HTTP_400_BAD_REQUEST
+    )
+
+@api_view(["GET"])
+def transfer_status(request, job_id):
+    try:
+        job = TransferJob.objects.select_related("receiver__user").get(
+            id=job_id, sender__user=request.user
+        )
+    except TransferJob.DoesNotExist:
+        return Response(
+            {"error": "Transfer not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    return Response(TransferJobSerializer(job).data)
 
 @api_view(["GET"])
 def transaction_history(request):
     user = request.user
-    wallets = Wallet.objects.filter(user=user)
 
     # Search and filter
     search = request.GET.get('search', '')
     currency_filter = request.GET.get('currency', '')
     type_filter = request.GET.get('type', '')
 
-    transactions = Transaction.objects.filter(
-        Q(sender__in=wallets) | Q(receiver__in=wallets)
-    )
+    try:
+        page_size, position = page_request(request)
+    except InvalidCursor:
+        return Response(
+            {"error": "Invalid cursor"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except ValueError:
+        return Response(
+            {"error": "page_size must be a number"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    wallet_ids = list(Wallet.objects.filter(user=user).values_list("id", flat=True))
+    transactions = listing_rows(Transaction.objects.all())
 
     if search:
-        transactions = transactions.filter(
-            Q(sender__user__email__icontains=search) |
-            Q(receiver__user__email__icontains=search) |
-            Q(from_currency__icontains=search) |
-            Q(to_currency__icontains=search)
-        )
+        transactions = search_transactions(transactions, search)
 
     if currency_filter:
         transactions = transactions.filter(
             Q(from_currency=currency_filter) | Q(to_currency=currency_filter)
         )
 
-    if type_filter:
-        if type_filter == 'sent':
-            transactions = transactions.filter(sender__in=wallets)
-        elif type_filter == 'received':
-            transactions = transactions.filter(receiver__in=wallets)
+    # one stream per wallet and direction, each served by its own index range
+    streams = []
+    if type_filter != 'received':
+        streams += [transactions.filter(sender_id=wallet_id) for wallet_id in wallet_ids]
+    if type_filter != 'sent':
+        streams += [transactions.filter(receiver_id=wallet_id) for wallet_id in wallet_ids]
 
-    transactions = transactions.order_by("-created_at")
+    page, has_more = keyset_page(streams, page_size, position)
 
-    serializer = TransactionSerializer(transactions, many=True, context={'request': request})
-    return Response(serializer.data)
+    return link_next(request, Response(encode_transactions(page, wallet_ids)), page, has_more)
 
 
 @api_view(["GET"])
 def analytics(request):
-    user = request.user
-    wallets = Wallet.objects.filter(user=user)
+    if "bucket" in request.query_params:
+        return analytics_series(request)
 
-    total_sent = Transaction.objects.filter(sender__in=wallets).aggregate(
-        total=Sum('amount_sent')
-    )['total'] or 0
+    # maintained by transactions.stats on every transfer
+    rows = TransactionStats.objects.filter(user=request.user).order_by("currency")
 
-    total_received = Transaction.objects.filter(receiver__in=wallets).aggregate(
-        total=Sum('amount_received')
-    )['total'] or 0
-
-    transaction_count = Transaction.objects.filter(
-        sender__in=wallets
-    ) | Transaction.objects.filter(
-        receiver__in=wallets
-    )
-    transaction_count = transaction_count.count()
+    total_sent = sum(row.total_sent for row in rows) or 0
+    total_received = sum(row.total_received for row in rows) or 0
 
     return Response({
         "total_sent": total_sent,
         "total_received": total_received,
-        "transaction_count": transaction_count,
-        "net_balance_change": total_received - total_sent
+        "transaction_count": sum(row.transaction_count for row in rows),
+        "net_balance_change": total_received - total_sent,
+        "by_currency": [
+            {
+                "currency": row.currency,
+                "total_sent": row.total_sent,
+                "total_received": row.total_received,
+                "transaction_count": row.transaction_count,
+            }
+            for row in rows
+        ],
     })
 
 
+def _date_range(params):
+    """Optional from/to dates. Raises ValueError with the reason."""
+    try:
+        start, end = (
+            date.fromisoformat(params[name]) if params.get(name) else None
+            for name in ("from", "to")
+        )
+    except (TypeError, ValueError):
+        raise ValueError("from and to must be dates (YYYY-MM-DD)")
+    # ranges end at midnight after `to`, which has to be a date too
+    if end == date.max:
+        raise ValueError(f"to must be before {date.max.isoformat()}")
+    return start, end
+
+
+def _export_params(params):
+    """(output, from, to) of an export request. Raises ValueError with the reason."""
+    output = params.get("output", "csv")
+    if output not in export.FORMATS:
+        raise ValueError(f"output must be one of: {', '.join(export.FORMATS)}")
+    return (output, *_date_range(params))
+
+
+def analytics_series(request):
+    bucket = request.query_params["bucket"]
+    if bucket not in series.BUCKETS:
+        return Response(
+            {"error": f"bucket must be one of: {', '.join(series.BUCKETS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        start, end = _date_range(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    end = end or timezone.localdate()
+    if start is None:
+        span = series.DEFAULT_SPAN[bucket]
+        start = end - span if end - date.min > span else date.min
+    if start > end:
+        return Response(
+            {"error": "from must not be after to"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if series.bucket_count(start, end, bucket) > series.MAX_BUCKETS:
+        return Response(
+            {"error": f"Range spans more than {series.MAX_BUCKETS} buckets"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    currency = request.query_params.get("currency", "").upper() or None
+    return Response(series.series(request.user, bucket, start, end, currency))
+
+
 @api_view(["GET"])
 def export_transactions(request):
-    user = request.user
-    wallets = Wallet.objects.filter(user=user)
-
-    transactions = Transaction.objects.filter(
-        Q(sender__in=wallets) | Q(receiver__in=wallets)
-    ).order_by("-created_at")
-
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="transactions.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Type', 'Amount Sent', 'Currency Sent', 'Amount Received', 'Currency Received', 'From/To'])
-
-    for tx in transactions:
-        is_sent = tx.sender.user == user
-        tx_type = 'Sent' if is_sent else 'Received'
-        amount_sent = tx.amount_sent if is_sent else ''
-        currency_sent = tx.from_currency if is_sent else ''
-        amount_received = tx.amount_received if not is_sent else ''
-        currency_received = tx.to_currency if not is_sent else ''
-        counterparty = tx.receiver.user.email if is_sent else tx.sender.user.email
-
-        writer.writerow([
-            tx.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            tx_type,
-            amount_sent,
-            currency_sent,
-            amount_received,
-            currency_received,
-            counterparty
-        ])
-
-    return response
\ No newline at end of file
+    # "output" rather than "format", which DRF reserves for picking a renderer
+    try:
+        output, start, end = _export_params(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    content = export.render(export.rows(request.user, start, end), output)
+    gzipped = bool(re.search(r"\bgzip\b", request.META.get("HTTP_ACCEPT_ENCODING", "")))
+    if gzipped:
+        content = compress_sequence(chunk.encode() for chunk in content)
+
+    response = StreamingHttpResponse(content, content_type=export.FORMATS[output])
+    response["Content-Disposition"] = f'attachment; filename="transactions.{output}"'
+    if gzipped:
+        response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+@api_view(["POST"])
+def create_export(request):
+    try:
+        output, start, end = _export_params(request.data)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if start and end and start > end:
+        return Response(
+            {"error": "from must not be after to"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    job = export_jobs.create(request.user, output, start, end)
+    logger.info(f"Export queued: job {job.pk} for {request.user.email}")
+    return Response(
+        ExportJobSerializer(job, context={"request": request}).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={"Location": f"/api/exports/{job.pk}/"}
+    )
+
+
+@api_view(["GET"])
+def export_status(request, job_id):
+    try:
+        job = ExportJob.objects.get(id=job_id, user=request.user)
+    except ExportJob.DoesNotExist:
+        return Response(
+            {"error": "Export not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    return Response(ExportJobSerializer(job, context={"request": request}).data)
+
+
+@api_view(["GET"])
+def download_export(request, job_id):
+    try:
+        job = ExportJob.objects.get(id=job_id, user=request.user)
+    except ExportJob.DoesNotExist:
+        return Response(
+            {"error": "Export not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    if job.status != ExportJob.COMPLETED:
+        return Response(
+            {"error": "Export is not ready"},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    return ranges.file_response(
+        request,
+        job.file.path,
+        job.size,
+        content_type=export.FORMATS[job.output],
+        filename=f"transactions-{job.pk}.{job.output}",
+        # the file of a job never changes, so its id is enough to validate a resume
+        etag=f'"export-{job.pk}"'
+    )
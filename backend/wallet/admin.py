@@ -1,8 +1,43 @@
 from django.contrib import admin
-from .models import Wallet
+from .models import BalanceSnapshot, LedgerEntry, Wallet, WalletShard
+
+
+class WalletShardInline(admin.TabularInline):
+    model = WalletShard
+    readonly_fields = ("index", "balance")
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Wallet)
 class WalletAdmin(admin.ModelAdmin):
-    list_display = ("user", "currency", "balance", "created_at")
+    list_display = ("user", "currency", "balance", "shard_count", "created_at")
     list_filter = ("currency",)
+    # balances only move through the ledger, shards through the shard_wallet command
+    readonly_fields = ("balance", "shard_count")
+    inlines = (WalletShardInline,)
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ("wallet", "kind", "amount", "transaction", "created_at")
+    list_filter = ("kind",)
+
+    # entries are immutable, they are only written through wallet.ledger
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BalanceSnapshot)
+class BalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("wallet", "balance", "last_entry_id", "taken_at")
+
@@ -0,0 +1,128 @@
+"""
+Bulk top-ups from CSV.
+
+Rows of (email, currency, amount) are read as a stream and handled a
+chunk at a time: users and wallets for the whole chunk are resolved with
+two queries, and the credits go through ledger.post, which applies them
+as set-based F() updates and bulk-inserts the ledger entries in one
+transaction per chunk. Bad rows are reported back instead of stopping
+the import.
+"""
+import codecs
+import csv
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from accounts.models import User
+from . import ledger
+from .models import Wallet
+
+CHUNK_SIZE = 5000
+HEADER = ["email", "currency", "amount"]
+
+ImportResult = namedtuple("ImportResult", "credited total rejected")
+Rejected = namedtuple("Rejected", "line row error")
+
+_MAX_AMOUNT = Decimal("9999999999.99")
+
+
+def is_utf8(f):
+    """
+    Whether a binary file decodes as UTF-8, read a block at a time and
+    rewound afterwards. Check before importing: chunks are committed as
+    they go, so a decode error halfway would leave a partial import.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for block in iter(lambda: f.read(64 * 1024), b""):
+            decoder.decode(block)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    finally:
+        f.seek(0)
+    return True
+
+
+def _parse(row):
+    """Returns (email, currency, amount) or raises ValueError with the reason."""
+    if len(row) != 3:
+        raise ValueError("Expected email, currency, amount")
+
+    email, currency, amount = (field.strip() for field in row)
+    if not email or not currency:
+        raise ValueError("Missing email or currency")
+    try:
+        amount = Decimal(amount)
+    except InvalidOperation:
+        raise ValueError("Invalid amount")
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError("Amount must be greater than zero")
+    if amount > _MAX_AMOUNT:
+        raise ValueError(f"Amount must be at most {_MAX_AMOUNT}")
+    if amount.as_tuple().exponent < -2:
+        raise ValueError("Amount has more than two decimal places")
+
+    return email, currency.upper(), amount
+
+
+def _apply(chunk, rejected):
+    """Credit one chunk of (line, row, parsed) tuples, returns (count, total)."""
+    users = dict(
+        User.objects.filter(email__in={parsed[0] for _, _, parsed in chunk})
+        .values_list("email", "id")
+    )
+    wallets = {
+        (user_id, currency): wallet_id
+        for wallet_id, user_id, currency in Wallet.objects.filter(
+            user_id__in=users.values(),
+            currency__in={parsed[1] for _, _, parsed in chunk}
+        ).values_list("id", "user_id", "currency")
+    }
+
+    credits = []
+    for line, row, (email, currency, amount) in chunk:
+        wallet_id = wallets.get((users.get(email), currency))
+        if wallet_id is None:
+            rejected.append(Rejected(line, row, "Wallet not found"))
+            continue
+        credits.append((wallet_id, currency, amount))
+
+    if credits:
+        ledger.top_up(credits)
+    return len(credits), sum((amount for _, _, amount in credits), Decimal("0.00"))
+
+
+def import_topups(lines, chunk_size=CHUNK_SIZE):
+    """
+    Credit every valid row of a CSV, given as an iterable of text lines.
+    A leading email,currency,amount header is skipped. Returns an
+    ImportResult with the credited row count, the amount credited and
+    the Rejected rows.
+    """
+    credited = 0
+    total = Decimal("0.00")
+    rejected = []
+    chunk = []
+
+    for line, row in enumerate(csv.reader(lines), start=1):
+        if not row or (line == 1 and [field.strip().lower() for field in row] == HEADER):
+            continue
+        try:
+            chunk.append((line, row, _parse(row)))
+        except ValueError as e:
+            rejected.append(Rejected(line, row, str(e)))
+            continue
+
+        if len(chunk) >= chunk_size:
+            count, amount = _apply(chunk, rejected)
+            credited += count
+            total += amount
+            chunk = []
+
+    if chunk:
+        count, amount = _apply(chunk, rejected)
+        credited += count
+        total += amount
+
+    return ImportResult(credited, total, sorted(rejected))
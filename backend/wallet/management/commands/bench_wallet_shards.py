@@ -0,0 +1,84 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from accounts.models import User
+from wallet import ledger
+from wallet.models import BalanceSnapshot, LedgerEntry, Wallet
+
+EMAIL = 'bench-hot-wallet@bench.invalid'
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent credits/sec to one hot wallet with and without balance shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--credits', type=int, default=500, help='Credits per thread')
+        parser.add_argument('--shards', type=int, default=16)
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark user afterwards')
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(email=EMAIL)
+        wallet, _ = Wallet.objects.get_or_create(user=user, currency='USD')
+
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite serializes all writers, expect no gain from sharding here'
+            ))
+
+        try:
+            for shards in (0, options['shards']):
+                ledger.set_shard_count(wallet.pk, shards)
+                self.run(wallet, shards, options['threads'], options['credits'])
+        finally:
+            if not options['keep']:
+                # ledger rows protect their wallets, drop the benchmark's own first
+                LedgerEntry.objects.filter(wallet__user=user).delete()
+                BalanceSnapshot.objects.filter(wallet__user=user).delete()
+                user.delete()
+
+    def run(self, wallet, shards, threads, credits):
+        before = Wallet.objects.get(pk=wallet.pk).total_balance
+        counts = {'ok': 0, 'errors': 0}
+        counts_lock = threading.Lock()
+
+        def worker():
+            local = dict.fromkeys(counts, 0)
+            try:
+                for _ in range(credits):
+                    try:
+                        ledger.post([LedgerEntry(
+                            wallet_id=wallet.pk,
+                            amount=Decimal('0.01'),
+                            kind=LedgerEntry.TOPUP
+                        )])
+                        local['ok'] += 1
+                    except OperationalError:
+                        local['errors'] += 1
+            finally:
+                connection.close()
+                with counts_lock:
+                    for key, value in local.items():
+                        counts[key] += value
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        after = Wallet.objects.get(pk=wallet.pk).total_balance
+        expected = before + Decimal(counts['ok']).scaleb(-2)
+        label = f'{shards} shards' if shards else 'single row'
+        self.stdout.write(
+            f"{label}: {counts['ok']} credits in {elapsed:.2f}s, "
+            f"{counts['ok'] / elapsed:,.0f} credits/sec, {counts['errors']} database errors"
+        )
+        if after != expected:
+            self.stdout.write(self.style.ERROR(f'Balance mismatch: expected {expected}, got {after}'))
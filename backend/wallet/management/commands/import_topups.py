@@ -0,0 +1,47 @@
+import csv
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.imports import CHUNK_SIZE, import_topups, is_utf8
+
+
+class Command(BaseCommand):
+    help = 'Credit wallets from a CSV of email,currency,amount rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per database transaction')
+        parser.add_argument('--rejects', help='Write rejected rows with their reason to this CSV')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options['path'], 'rb') as f:
+                if not is_utf8(f):
+                    raise CommandError(f"{options['path']} is not UTF-8, nothing was imported")
+                result = import_topups(io.TextIOWrapper(f, encoding='utf-8-sig', newline=''), options['chunk_size'])
+        except OSError as e:
+            raise CommandError(e)
+        elapsed = time.monotonic() - started
+
+        rows = result.credited + len(result.rejected)
+        self.stdout.write(self.style.SUCCESS(
+            f'Credited {result.credited} rows ({result.total} total) in {elapsed:.2f}s, '
+            f'{rows / elapsed if elapsed else rows:,.0f} rows/sec'
+        ))
+
+        if not result.rejected:
+            return
+
+        self.stdout.write(self.style.WARNING(f'Rejected {len(result.rejected)} rows'))
+        if options['rejects']:
+            with open(options['rejects'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['line', 'email', 'currency', 'amount', 'error'])
+                for rejected in result.rejected:
+                    writer.writerow([rejected.line, *rejected.row, rejected.error])
+        else:
+            for rejected in result.rejected[:20]:
+                self.stdout.write(f'  line {rejected.line}: {rejected.error}')
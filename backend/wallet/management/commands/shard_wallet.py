@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet.ledger import set_shard_count
+from wallet.models import Wallet
+
+
+class Command(BaseCommand):
+    help = 'Spread credits to a hot wallet over N balance shards (0 turns sharding off)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('wallet_id', type=int)
+        parser.add_argument('shards', type=int)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['shards'] <= 256:
+            raise CommandError('shards must be between 0 and 256')
+
+        try:
+            set_shard_count(options['wallet_id'], options['shards'])
+        except Wallet.DoesNotExist:
+            raise CommandError(f"Wallet {options['wallet_id']} not found")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wallet {options['wallet_id']} now has {options['shards']} shards"
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Max, OuterRef, Q, Subquery
+
+from wallet.ledger import take_snapshot
+from wallet.models import BalanceSnapshot, Wallet
+
+
+class Command(BaseCommand):
+    help = 'Snapshot the balance of every wallet with ledger activity since its last snapshot'
+
+    def handle(self, *args, **options):
+        latest_snapshot = (
+            BalanceSnapshot.objects
+            .filter(wallet=OuterRef('pk'))
+            .order_by('-taken_at')
+            .values('last_entry_id')[:1]
+        )
+        wallet_ids = (
+            Wallet.objects
+            .annotate(
+                last_entry=Max('ledger_entries__id'),
+                snapshot_entry=Subquery(latest_snapshot)
+            )
+            .filter(last_entry__isnull=False)
+            .filter(Q(snapshot_entry__isnull=True) | Q(last_entry__gt=F('snapshot_entry')))
+            .values_list('id', flat=True)
+        )
+
+        count = 0
+        for wallet_id in wallet_ids.iterator():
+            take_snapshot(wallet_id)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted {count} wallets'))
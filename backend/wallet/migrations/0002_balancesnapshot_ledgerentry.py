@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0001_initial'),
+        ('wallet', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('last_entry_id', models.BigIntegerField()),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='wallet.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', 'taken_at'], name='snapshot_wallet_time_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('kind', models.CharField(choices=[('opening', 'Opening balance'), ('topup', 'Top-up'), ('transfer_out', 'Transfer out'), ('transfer_in', 'Transfer in')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='transactions.transaction')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='wallet.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', 'created_at'], name='ledger_wallet_time_idx')],
+            },
+        ),
+    ]
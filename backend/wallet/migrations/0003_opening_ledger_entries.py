@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_opening_entries(apps, schema_editor):
+    # existing balances predate the ledger, record them as opening entries
+    Wallet = apps.get_model('wallet', 'Wallet')
+    LedgerEntry = apps.get_model('wallet', 'LedgerEntry')
+
+    entries = [
+        LedgerEntry(wallet_id=wallet_id, amount=balance, kind='opening')
+        for wallet_id, balance in Wallet.objects.exclude(balance=0).values_list('id', 'balance').iterator()
+    ]
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0002_balancesnapshot_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_opening_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0003_opening_ledger_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='WalletShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='wallet.wallet')),
+            ],
+            options={
+                'unique_together': {('wallet', 'index')},
+            },
+        ),
+    ]
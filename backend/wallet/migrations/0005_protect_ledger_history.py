@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0004_wallet_shard_count_walletshard'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='balancesnapshot',
+            name='wallet',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='balance_snapshots', to='wallet.wallet'),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='wallet',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='wallet.wallet'),
+        ),
+    ]
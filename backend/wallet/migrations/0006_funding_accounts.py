@@ -0,0 +1,61 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def offset_topups(apps, schema_editor):
+    # top-ups posted before funding accounts were single-sided, give each its debit
+    FundingAccount = apps.get_model('wallet', 'FundingAccount')
+    LedgerEntry = apps.get_model('wallet', 'LedgerEntry')
+
+    topups = LedgerEntry.objects.filter(kind='topup').values_list('amount', 'created_at', 'wallet__currency')
+    currencies = set()
+    entries = []
+    for amount, created_at, currency in topups.iterator():
+        currencies.add(currency)
+        entries.append(LedgerEntry(funding_account_id=currency, amount=-amount, kind='funding', created_at=created_at))
+    FundingAccount.objects.bulk_create([FundingAccount(currency=currency) for currency in currencies])
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0009_backfill_transactionstats'),
+        ('wallet', '0005_protect_ledger_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundingAccount',
+            fields=[
+                ('currency', models.CharField(max_length=10, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='kind',
+            field=models.CharField(choices=[('opening', 'Opening balance'), ('topup', 'Top-up'), ('funding', 'Funding'), ('transfer_out', 'Transfer out'), ('transfer_in', 'Transfer in')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='transaction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='transactions.transaction'),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='wallet',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='wallet.wallet'),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='funding_account',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='wallet.fundingaccount'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerentry',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('funding_account__isnull', True), ('wallet__isnull', False)), models.Q(('funding_account__isnull', False), ('wallet__isnull', True)), _connector='OR'), name='ledger_entry_one_account'),
+        ),
+        migrations.RunPython(offset_topups, migrations.RunPython.noop),
+    ]
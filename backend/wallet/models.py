@@ -1,5 +1,27 @@
+from decimal import Decimal
+
 from django.db import models
 from django.conf import settings
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+class WalletQuerySet(models.QuerySet):
+    def with_shard_balance(self):
+        """Annotate shard_balance so total_balance needs no extra query per wallet."""
+        shard_total = (
+            WalletShard.objects
+            .filter(wallet=OuterRef("pk"))
+            .values("wallet")
+            .annotate(total=Sum("balance"))
+            .values("total")
+        )
+        return self.annotate(shard_balance=Coalesce(
+            Subquery(shard_total),
+            Value(Decimal("0.00")),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2)
+        ))
 
 
 class Wallet(models.Model):
@@ -10,10 +32,147 @@ class Wallet(models.Model):
     )
     currency = models.CharField(max_length=10)
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    # 0 keeps the whole balance on this row; N > 0 spreads credits over N WalletShards
+    shard_count = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = WalletQuerySet.as_manager()
+
     class Meta:
         unique_together = ("user", "currency")
 
     def __str__(self):
         return f"{self.user.email} - {self.currency}"
+
+    @property
+    def total_balance(self):
+        """Balance including credits still sitting on shard rows."""
+        if not self.shard_count:
+            return self.balance
+        shard_balance = getattr(self, "shard_balance", None)
+        if shard_balance is None:
+            shard_balance = self.shards.aggregate(total=Sum("balance"))["total"] or 0
+        return self.balance + shard_balance
+
+
+class WalletShard(models.Model):
+    """
+    Sub-balance of a hot wallet. Credits land on a random shard so
+    concurrent credits don't queue on the Wallet row lock; debits fold
+    the shards back into Wallet.balance first.
+    """
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        related_name="shards"
+    )
+    index = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("wallet", "index")
+
+    def __str__(self):
+        return f"{self.wallet} shard {self.index}"
+
+
+class FundingAccount(models.Model):
+    """
+    Where money enters the system from outside, one per currency. Each
+    top-up credit is posted with a matching debit here. The account's
+    balance is the sum of its entries; nothing checks it, so there is no
+    balance row for top-ups to queue on.
+    """
+    currency = models.CharField(max_length=10, primary_key=True)
+
+    def __str__(self):
+        return f"{self.currency} funding"
+
+
+class LedgerEntry(models.Model):
+    """
+    Immutable record of one balance movement, credits positive and
+    debits negative, on either a wallet or a funding account.
+    Wallet.balance is the running sum of the wallet's entries.
+    """
+    OPENING = "opening"
+    TOPUP = "topup"
+    FUNDING = "funding"
+    TRANSFER_OUT = "transfer_out"
+    TRANSFER_IN = "transfer_in"
+
+    KIND_CHOICES = (
+        (OPENING, "Opening balance"),
+        (TOPUP, "Top-up"),
+        (FUNDING, "Funding"),
+        (TRANSFER_OUT, "Transfer out"),
+        (TRANSFER_IN, "Transfer in"),
+    )
+
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="ledger_entries"
+    )
+    funding_account = models.ForeignKey(
+        FundingAccount,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="ledger_entries"
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    transaction = models.ForeignKey(
+        "transactions.Transaction",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="ledger_entries"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["wallet", "created_at"], name="ledger_wallet_time_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(wallet__isnull=False, funding_account__isnull=True)
+                    | models.Q(wallet__isnull=True, funding_account__isnull=False)
+                ),
+                name="ledger_entry_one_account"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Ledger entries are immutable")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.wallet or self.funding_account} {self.amount:+} ({self.kind})"
+
+
+class BalanceSnapshot(models.Model):
+    """Wallet balance including every ledger entry up to last_entry_id."""
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.PROTECT,
+        related_name="balance_snapshots"
+    )
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    last_entry_id = models.BigIntegerField()
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["wallet", "taken_at"], name="snapshot_wallet_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet} {self.balance} @ {self.taken_at}"
+
@@ -3,6 +3,10 @@ from .models import Wallet
 
 
 class WalletSerializer(serializers.ModelSerializer):
+    balance = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="total_balance", read_only=True
+    )
+
     class Meta:
         model = Wallet
         fields = ("id", "currency", "balance", "created_at")
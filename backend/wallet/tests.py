@@ -1,8 +1,20 @@
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models import ProtectedError
 from django.test import TestCase
-from rest_framework.test import APITestCase
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from .models import Wallet
+from . import ledger
+from .imports import import_topups
+from .models import LedgerEntry, Wallet, WalletShard
 
 User = get_user_model()
 
@@ -25,3 +37,188 @@ class WalletTest(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
+
+    def test_delete_keeps_ledger_history(self):
+        unused = Wallet.objects.create(user=self.user, currency='EUR')
+        used = Wallet.objects.create(user=self.user, currency='USD')
+        ledger.post([LedgerEntry(wallet_id=used.pk, amount=Decimal('5.00'), kind=LedgerEntry.TOPUP)])
+        ledger.post([LedgerEntry(wallet_id=used.pk, amount=Decimal('-5.00'), kind=LedgerEntry.TRANSFER_OUT)])
+
+        response = self.client.delete(f'/api/wallets/{used.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertRaises(ProtectedError):
+            used.delete()
+        self.assertEqual(LedgerEntry.objects.filter(wallet=used).count(), 2)
+
+        response = self.client.delete(f'/api/wallets/{unused.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Wallet.objects.filter(pk=unused.pk).exists())
+
+    def test_topup_is_recorded_in_ledger(self):
+        wallet = Wallet.objects.create(user=self.user, currency='USD')
+        response = self.client.post('/api/wallets/topup/', {'currency': 'USD', 'amount': '25.50'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['new_balance'], Decimal('25.50'))
+
+        entry = LedgerEntry.objects.get(wallet=wallet)
+        self.assertEqual((entry.kind, entry.amount), (LedgerEntry.TOPUP, Decimal('25.50')))
+        # offset by the USD funding account
+        funding = LedgerEntry.objects.get(funding_account='USD')
+        self.assertEqual((funding.kind, funding.amount), (LedgerEntry.FUNDING, Decimal('-25.50')))
+
+
+class LedgerTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email='test@example.com', password='testpass')
+        self.wallet = Wallet.objects.create(user=user, currency='USD')
+
+    def credit(self, amount, days_ago):
+        created_at = timezone.now() - timedelta(days=days_ago)
+        ledger.post([LedgerEntry(wallet=self.wallet, amount=amount, kind=LedgerEntry.TOPUP, created_at=created_at)])
+
+    def test_debit_cannot_overdraw(self):
+        self.credit(10, 0)
+        with self.assertRaises(ledger.InsufficientBalance):
+            ledger.post([LedgerEntry(wallet=self.wallet, amount=-11, kind=LedgerEntry.TRANSFER_OUT)])
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, 10)
+        self.assertEqual(LedgerEntry.objects.count(), 1)
+
+    def test_balance_at(self):
+        self.credit(10, 3)
+        self.credit(5, 2)
+        ledger.take_snapshot(self.wallet.pk)
+        self.credit(1, 0)
+
+        now = timezone.now()
+        self.assertEqual(ledger.balance_at(self.wallet.pk, now - timedelta(days=4)), 0)
+        self.assertEqual(ledger.balance_at(self.wallet.pk, now - timedelta(days=2, hours=12)), 10)
+        self.assertEqual(ledger.balance_at(self.wallet.pk, now), 16)
+
+    def test_entries_are_immutable(self):
+        self.credit(10, 0)
+        entry = LedgerEntry.objects.get()
+        entry.amount = 100
+        with self.assertRaises(ValueError):
+            entry.save()
+
+
+class ShardedWalletTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='test@example.com', password='testpass')
+        self.wallet = Wallet.objects.create(user=self.user, currency='USD')
+        ledger.set_shard_count(self.wallet.pk, 4)
+        self.client.force_authenticate(user=self.user)
+
+    def post(self, amount):
+        kind = LedgerEntry.TOPUP if amount > 0 else LedgerEntry.TRANSFER_OUT
+        ledger.post([LedgerEntry(wallet_id=self.wallet.pk, amount=amount, kind=kind)])
+
+    def test_credits_land_on_shards(self):
+        for _ in range(5):
+            self.post(Decimal('2.00'))
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, 0)
+        self.assertEqual(self.wallet.total_balance, Decimal('10.00'))
+
+        response = self.client.get('/api/wallets/')
+        self.assertEqual(response.data[0]['balance'], '10.00')
+
+    def test_debit_folds_shards(self):
+        self.post(Decimal('6.00'))
+        self.post(Decimal('4.00'))
+        with self.assertRaises(ledger.InsufficientBalance):
+            self.post(Decimal('-10.01'))
+
+        self.post(Decimal('-7.00'))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('3.00'))
+        self.assertFalse(WalletShard.objects.exclude(balance=0).exists())
+
+    def test_unsharding_keeps_balance(self):
+        self.post(Decimal('5.00'))
+        ledger.set_shard_count(self.wallet.pk, 0)
+
+        self.wallet.refresh_from_db()
+        self.assertEqual((self.wallet.balance, self.wallet.shard_count), (Decimal('5.00'), 0))
+        self.assertFalse(WalletShard.objects.exists())
+
+    def test_credit_racing_a_resize(self):
+        self.post(Decimal('5.00'))
+        credit_shard = ledger._credit_shard
+
+        def resized_first(wallet_id, shard_count, amount):
+            # set_shard_count commits between post() reading shard_count and the credit
+            ledger.set_shard_count(wallet_id, 0)
+            credit_shard(wallet_id, shard_count, amount)
+
+        with mock.patch('wallet.ledger._credit_shard', side_effect=resized_first):
+            self.post(Decimal('2.00'))
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.total_balance, Decimal('7.00'))
+        self.assertEqual(self.wallet.balance, Decimal('7.00'))
+
+
+class ImportTopupsTest(TestCase):
+    def setUp(self):
+        self.alice = Wallet.objects.create(
+            user=User.objects.create_user(email='alice@example.com', password='testpass'), currency='USD'
+        )
+        self.bob = Wallet.objects.create(
+            user=User.objects.create_user(email='bob@example.com', password='testpass'), currency='EUR'
+        )
+
+    def test_import(self):
+        lines = [
+            'email,currency,amount',
+            'alice@example.com,usd,10.50',
+            'bob@example.com,EUR,5',
+            'alice@example.com,USD,1.25',
+            'carol@example.com,USD,3',
+            'bob@example.com,EUR,-1',
+            'bob@example.com,EUR,1.001',
+            'bob@example.com,EUR,99999999999',
+        ]
+        result = import_topups(lines, chunk_size=2)
+
+        self.assertEqual((result.credited, result.total), (3, Decimal('16.75')))
+        self.assertEqual(
+            [(r.line, r.error) for r in result.rejected],
+            [(5, 'Wallet not found'), (6, 'Amount must be greater than zero'),
+             (7, 'Amount has more than two decimal places'), (8, 'Amount must be at most 9999999999.99')]
+        )
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.balance, self.bob.balance), (Decimal('11.75'), Decimal('5.00')))
+        self.assertEqual(LedgerEntry.objects.filter(kind=LedgerEntry.TOPUP).count(), 3)
+
+    def test_command_writes_rejects(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'topups.csv')
+            rejects = os.path.join(tmp, 'rejects.csv')
+            with open(path, 'w') as f:
+                f.write('alice@example.com,USD,2\nnobody@example.com,USD,2\n')
+
+            call_command('import_topups', path, rejects=rejects, stdout=StringIO())
+
+            with open(rejects) as f:
+                self.assertIn('nobody@example.com', f.read())
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, Decimal('2.00'))
+
+    def test_non_utf8_upload_imports_nothing(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='testpass')
+        client = APIClient()
+        client.force_authenticate(user=admin)
+
+        # a bad byte after more rows than one import chunk
+        rows = b'alice@example.com,USD,1\n' * 6000 + b'bob@example.com,EUR,\xff\n'
+        response = client.post('/api/admin-ui/topups/import/', {'file': SimpleUploadedFile('t.csv', rows)})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.balance, 0)
+        self.assertFalse(LedgerEntry.objects.exists())
@@ -2,8 +2,9 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from django.db import transaction as db_transaction
 
+from transactions.idempotency import idempotent
+from . import ledger
 from .models import Wallet
 from .serializers import WalletSerializer, WalletTopUpSerializer
 
@@ -13,7 +14,7 @@ def wallet_list_create(request):
     user = request.user
 
     if request.method == "GET":
-        wallets = Wallet.objects.filter(user=user)
+        wallets = Wallet.objects.filter(user=user).with_shard_balance()
         serializer = WalletSerializer(wallets, many=True)
         return Response(serializer.data)
 
@@ -52,17 +53,25 @@ def wallet_delete(request, wallet_id):
             status=status.HTTP_404_NOT_FOUND
         )
 
-    if wallet.balance > 0:
+    if wallet.total_balance > 0:
         return Response(
             {"error": "Cannot delete wallet with balance"},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    # the ledger is append-only, a wallet that has moved money is kept
+    if wallet.ledger_entries.exists():
+        return Response(
+            {"error": "Cannot delete wallet with transaction history"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
     wallet.delete()
     return Response({"message": "Wallet deleted"})
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent
 def wallet_topup(request):
     serializer = WalletTopUpSerializer(data=request.data)
 
@@ -80,13 +89,12 @@ def wallet_topup(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    with db_transaction.atomic():
-        wallet.balance += amount
-        wallet.save()
+    ledger.top_up([(wallet.pk, currency, amount)])
+    wallet.refresh_from_db(fields=["balance"])
 
     return Response({
         "message": "Wallet topped up successfully",
         "currency": currency,
         "added_amount": amount,
-        "new_balance": wallet.balance
+        "new_balance": wallet.total_balance
     })
\ No newline at end of file
@@ -15,22 +15,29 @@ function Transactions() {
   const [filterType, setFilterType] = useState("");
   const [startDate, setStartDate] = useState("");
   const [endDate, setEndDate] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
+  const [lastParams, setLastParams] = useState({});
 
   useEffect(() => {
     fetchTransactions();
   }, []);
 
-  const fetchTransactions = async (params = {}) => {
+  // the API returns one page at a time and the next page's cursor in X-Next-Cursor
+  const fetchTransactions = async (params = {}, cursor = null) => {
     try {
       const queryParams = new URLSearchParams();
       if (params.search) queryParams.append('search', params.search);
       if (params.type) queryParams.append('type', params.type);
       if (params.start_date) queryParams.append('start_date', params.start_date);
       if (params.end_date) queryParams.append('end_date', params.end_date);
+      if (cursor) queryParams.append('cursor', cursor);
 
       const url = `/transactions/?${queryParams.toString()}`;
       const res = await api.get(url);
-      setTransactions(res.data || []);
+      const page = res.data || [];
+      setTransactions((previous) => (cursor ? [...previous, ...page] : page));
+      setNextCursor(res.headers["x-next-cursor"] || null);
+      setLastParams(params);
       setLoading(false);
     } catch (err) {
       if (err.response?.status === 401) {
@@ -182,6 +189,14 @@ function Transactions() {
               </div>
             );
           })}
+          {nextCursor && (
+            <button
+              onClick={() => fetchTransactions(lastParams, nextCursor)}
+              className="btn-secondary"
+            >
+              Load more
+            </button>
+          )}
         </div>
       )}
     </div>